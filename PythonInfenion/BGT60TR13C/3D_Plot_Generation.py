@@ -1,8 +1,8 @@
 import numpy as np
+from numpy.lib.recfunctions import structured_to_unstructured
 import matplotlib.pyplot as plt
-from scipy import constants
-from sklearn.cluster import DBSCAN
 import time
+import argparse
 
 from ifxradarsdk.fmcw import DeviceFmcw
 from ifxradarsdk.fmcw.types import FmcwSimpleSequenceConfig, FmcwSequenceChirp
@@ -10,17 +10,30 @@ from ifxradarsdk.common.exceptions import ErrorFrameAcquisitionFailed
 
 from helpers.DigitalBeamForming import DigitalBeamForming
 from helpers.DopplerAlgo import DopplerAlgo
-from helpers.DistanceAlgo import DistanceAlgo
+from helpers.SensorGeometry import SensorGeometry
+from helpers.TargetHistory import TargetHistory
+from helpers.TargetTracker import TargetTracker
+from helpers.cfar import ca_cfar
+from helpers.grid_dbscan import grid_dbscan, cluster_centroids
+from helpers.AngleEstimator2D import AngleEstimator2D
+from helpers.PointCloudBuilder import PointCloudBuilder
+from replay_device import ReplayDeviceFmcw
 
 class Radar3DProcessing:
-    def __init__(self, config):
+    def __init__(self, config, device=None):
         self.config = config
-        self.device = DeviceFmcw()
+        self.device = device if device is not None else DeviceFmcw()
         self.setup_device()
         
-        self.doppler = DopplerAlgo(config.chirp.num_samples, config.num_chirps, self.num_rx_antennas)
-        self.dbf = DigitalBeamForming(self.num_rx_antennas, num_beams=27, max_angle_degrees=45)
-        self.distance_algo = DistanceAlgo(config.chirp, config.num_chirps)
+        self.geometry = SensorGeometry(config, num_beams=27, max_angle_degrees=45)
+        self.doppler = DopplerAlgo(config.chirp.num_samples, config.num_chirps, self.num_rx_antennas,
+                                   doppler_zero_pad=self.geometry.doppler_zero_pad)
+        self.dbf = DigitalBeamForming(self.num_rx_antennas, num_beams=self.geometry.num_beams,
+                                      max_angle_degrees=self.geometry.max_angle_degrees)
+        # azimuth and elevation of every detection from the L-shaped array of
+        # the three RX antennas
+        self.point_cloud = PointCloudBuilder(self.geometry, angle_estimator=AngleEstimator2D(
+            max_azimuth_degrees=self.geometry.max_angle_degrees))
         
         self.fig = plt.figure(figsize=(10, 8))
         self.ax = self.fig.add_subplot(111, projection='3d')
@@ -29,7 +42,11 @@ class Radar3DProcessing:
         self.cooldown_time = 1.0
         self.last_failure_time = 0
         
-        self.all_targets = []
+        # tracks of the clustered targets in the x-y plane, keeps their
+        # identity across frames
+        self.tracker = TargetTracker(num_dims=2, dt=config.frame_repetition_time_s, measurement_noise=0.2)
+        # cartesian targets of the plotted frames
+        self.all_targets = TargetHistory(max_frames=100)
         
     def setup_device(self):
         sequence = self.device.create_simple_sequence(self.config)
@@ -58,6 +75,8 @@ class Radar3DProcessing:
                     self.last_failure_time = time.time()
                     return None
                 time.sleep(0.05)
+            except EOFError:
+                raise
             except Exception as e:
                 print(f"Unexpected error during frame acquisition: {e}")
                 return None
@@ -66,60 +85,49 @@ class Radar3DProcessing:
             return None
         
         try:
-            rd_spectrum = np.zeros((self.config.chirp.num_samples, 2 * self.config.num_chirps, self.num_rx_antennas), dtype=complex)
-            for i_ant in range(self.num_rx_antennas):
-                mat = frame[i_ant, :, :]
-                rd_spectrum[:, :, i_ant] = self.doppler.compute_doppler_map(mat, i_ant)
+            rd_spectrum = self.doppler.compute_doppler_cube(frame)
             
             rd_beam_formed = self.dbf.run(rd_spectrum)
             
-            threshold = np.mean(np.abs(rd_beam_formed)) + 3 * np.std(np.abs(rd_beam_formed))
-            detections = np.abs(rd_beam_formed) > threshold
+            # CFAR over range and Doppler of every beam, the Doppler axis is circular
+            detections = ca_cfar(np.abs(rd_beam_formed) ** 2, guard=(1, 2, 0), train=(4, 8, 0), pfa=1e-6,
+                                 mode=("reflect", "wrap", "reflect"), axis_names=("range", "doppler", "beam"))
             
-            targets = []
-            for r, d, b in np.argwhere(detections):
-                range_m = r * self.distance_algo.range_bin_length
-                doppler_hz = (d - self.config.num_chirps) * (1 / (self.config.chirp_repetition_time_s * self.config.num_chirps))
-                angle_rad = np.deg2rad(np.linspace(-45, 45, 27)[b])
-                targets.append([range_m, doppler_hz, angle_rad])
+            points = self.point_cloud.build(detections, rd_spectrum)
             
-            if targets:
-                clusterer = DBSCAN(eps=0.5, min_samples=3)
-                clusters = clusterer.fit_predict(targets)
-                
-                final_targets = []
-                for i in range(max(clusters) + 1):
-                    cluster_points = np.array([t for t, c in zip(targets, clusters) if c == i])
-                    final_targets.append(np.mean(cluster_points, axis=0))
-                
-                return np.array(final_targets)
-            else:
-                return np.array([])
+            # clusters in range (m), Doppler (Hz) and angle (rad), the targets
+            # are the cartesian centroids of the clusters
+            clusters = grid_dbscan(structured_to_unstructured(points[["range", "doppler", "angle"]]),
+                                   eps=0.5, min_samples=3)
+            return cluster_centroids(structured_to_unstructured(points[["x", "y", "z"]]), clusters)
         except Exception as e:
             print(f"Error during frame processing: {e}")
             return None
 
-    def convert_to_cartesian(self, targets):
-        x = targets[:, 0] * np.cos(targets[:, 2])
-        y = targets[:, 0] * np.sin(targets[:, 2])
-        center_frequency_Hz = (self.config.chirp.start_frequency_Hz + self.config.chirp.end_frequency_Hz) / 2
-        z = targets[:, 1] * constants.c / (2 * center_frequency_Hz)
-        return np.column_stack((x, y, z))
-
     def visualize_3d(self):
         self.ax.clear()
         if self.all_targets:
-            cart_targets = np.vstack(self.all_targets)
+            cart_targets = self.all_targets.points()
             colors = cart_targets[:, 0]  
             scatter = self.ax.scatter(cart_targets[:, 0], cart_targets[:, 1], cart_targets[:, 2], c=colors, cmap='viridis', s=10, alpha=0.6)
+        track_ids, positions, _ = self.tracker.tracks()
+        if len(track_ids):
+            self.ax.scatter(positions[:, 0], positions[:, 1], np.zeros(len(track_ids)), c='red', marker='x', s=40)
+            for track_id, (x, y) in zip(track_ids, positions):
+                self.ax.text(x, y, 0, str(track_id), color='red')
         self.ax.set_xlabel('X (m)')
         self.ax.set_ylabel('Y (m)')
-        self.ax.set_zlabel('Z (m/s)')
+        self.ax.set_zlabel('Z (m)')
         self.ax.set_title(f'3D Radar Targets (Frame {len(self.all_targets)})')
         self.fig.canvas.draw()
         self.fig.canvas.flush_events()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="3D plot of radar targets")
+    parser.add_argument('--replay', help="replay a recorded session instead of using the sensor")
+    parser.add_argument('--fast', action='store_true', help="replay as fast as possible")
+    args = parser.parse_args()
+
     config = FmcwSimpleSequenceConfig(
         frame_repetition_time_s=0.05,
         chirp_repetition_time_s=0.0005,
@@ -138,7 +146,8 @@ if __name__ == "__main__":
         )
     )
 
-    radar = Radar3DProcessing(config)
+    device = ReplayDeviceFmcw(args.replay, realtime=not args.fast) if args.replay else None
+    radar = Radar3DProcessing(config, device)
     print("Radar processing initialized")
 
     plt.ion()
@@ -147,9 +156,11 @@ if __name__ == "__main__":
         while frame_count < 100:  
             start_time = time.time()
             targets = radar.process_frame()
+            if targets is not None:
+                # frames without targets count as misses of the tracks
+                radar.tracker.update(targets[:, :2])
             if targets is not None and len(targets) > 0:
-                cart_targets = radar.convert_to_cartesian(targets)
-                radar.all_targets.append(cart_targets)
+                radar.all_targets.append(targets)
                 radar.visualize_3d()
                 frame_count += 1
                 print(f"Processed frame {frame_count}/100")
@@ -162,6 +173,8 @@ if __name__ == "__main__":
                 break
     except KeyboardInterrupt:
         print("Interrupted by user")
+    except EOFError:
+        print("End of recording")
     finally:
         plt.ioff()
         plt.savefig('radar_3d_plot.png')
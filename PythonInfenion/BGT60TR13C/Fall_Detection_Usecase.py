@@ -1,35 +1,48 @@
+import argparse
 import sys
 from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QVBoxLayout, QWidget, QFrame, QMessageBox, QPushButton
 from PyQt5.QtCore import QTimer, Qt, QUrl
 from PyQt5.QtGui import QColor, QFont, QPixmap
 from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
 import numpy as np
-from scipy import signal
 from scipy.ndimage import convolve
 from ifxradarsdk.fmcw import DeviceFmcw
 from ifxradarsdk.fmcw.types import FmcwSimpleSequenceConfig, FmcwSequenceChirp
-from helpers.fft_spectrum import fft_spectrum 
+from helpers import fft_backend, precision
+from helpers.MicroDopplerSpectrogram import MicroDopplerSpectrogram
+from helpers.SensorGeometry import SensorGeometry
 from radar_data_acquisition import initialize_radar, get_radar_data
 
 
 class FallDetectionAlgo:
-    def __init__(self, num_samples_per_chirp, num_chirps_per_frame, chirp_repetition_time_s, start_frequency_Hz):
-        self.num_samples_per_chirp = num_samples_per_chirp
-        self.num_chirps_per_frame = num_chirps_per_frame
-        self.chirp_repetition_time_s = chirp_repetition_time_s
-        self.start_frequency_Hz = start_frequency_Hz
-        self.window = signal.windows.blackmanharris(num_samples_per_chirp).reshape(1, num_samples_per_chirp)
+    def __init__(self, geometry: SensorGeometry):
+        self.geometry = geometry
+        self.num_samples_per_chirp = geometry.num_samples
+        self.num_chirps_per_frame = geometry.num_chirps
+        # the Doppler FFT is not zero padded, geometry.velocity_axis_m_s
+        # has to have one entry per chirp
+        if geometry.num_doppler_bins != geometry.num_chirps:
+            raise ValueError(f"FallDetectionAlgo needs a geometry without Doppler zero padding, got "
+                             f"{geometry.num_doppler_bins} Doppler bins for {geometry.num_chirps} chirps")
+        self.velocity_axis = geometry.velocity_axis_m_s
+        self.zero_velocity_bin = geometry.num_doppler_bins // 2
+        # Doppler profiles of the last frames
+        self.spectrogram = MicroDopplerSpectrogram(geometry.num_doppler_bins, history=32,
+                                                   velocity_axis=geometry.velocity_axis_m_s)
         self.fall_threshold = 1
+        # radial velocity of a fall in m/s. The velocity axis uses the
+        # wavelength of the centre frequency, about 3% below the velocities
+        # of the former start frequency wavelength. For the fall profile
+        # (283 us chirps, 64 chirps) the Doppler bins are at multiples of
+        # 0.134 m/s instead of 0.138 m/s, bins 5 and above exceed 0.6 m/s
+        # with both wavelengths, so the threshold was kept.
+        self.fall_velocity_m_s = 0.6
         self.alpha = 0.4
         self.slow_avg = None
         self.fast_avg = None
         self.first_run = True
 
     def detect_fall(self, mat):
-        mat_fil = mean_filter(mat)
-        range_fft = fft_spectrum(mat_fil, self.window)
-        fft_spec_abs = abs(range_fft)
-        fft_norm = np.divide(fft_spec_abs.sum(axis=0), self.num_chirps_per_frame)
         radial_velocity = self.calculate_radial_velocity(mat)
         fft_norm = radial_velocity
         if self.first_run:
@@ -40,25 +53,23 @@ class FallDetectionAlgo:
         self.fast_avg = self.fast_avg * self.alpha + fft_norm * (1 - self.alpha)
         data = self.fast_avg - self.slow_avg
         fall_detected = np.max(data) > self.fall_threshold
-        write_ndarray_to_file(mat, 'mat_data.txt')
-        fall_detected = abs(radial_velocity) > 0.6
+        fall_detected = abs(radial_velocity) > self.fall_velocity_m_s
         return fall_detected
 
     def calculate_radial_velocity(self, mat_fil):
-        doppler_fft = np.fft.fftshift(np.fft.fft2(mat_fil, axes=(0, 1)), axes=0)
-        doppler_freq = np.fft.fftfreq(self.num_chirps_per_frame, self.chirp_repetition_time_s)
-        doppler_freq = np.fft.fftshift(doppler_freq)
+        mat_fil = np.asarray(mat_fil, dtype=precision.float_dtype())
+        doppler_fft = fft_backend.fftshift(fft_backend.fft2(mat_fil, axes=(0, 1)), axes=0)
         doppler_spectrum = np.abs(doppler_fft).sum(axis=1)
-        doppler_spectrum[32] = 0
-        peak_index = np.argmax(doppler_spectrum)
-        c = 3e8  # Speed of light in m/s
-        wavelength = c / self.start_frequency_Hz
-        velocity = doppler_freq[peak_index] * wavelength / 2
-        return velocity
+        doppler_spectrum[self.zero_velocity_bin] = 0
+        self.spectrogram.push(doppler_spectrum)
+        return self.spectrogram.peak_velocity(1)[0]
 
 class FallDetectionApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, record_path=None):
+        # record_path: optional file the raw frames are recorded to, see
+        #              frame_recording
         super().__init__()
+        self.record_path = record_path
         self.initUI()
         self.algo = None
         self.device = None
@@ -107,24 +118,21 @@ class FallDetectionApp(QMainWindow):
 
     def setup_radar(self):
         try:
-            initialize_radar()
+            initialize_radar(profile_names=("fall",))
             self.radar_data = get_radar_data()
             config = self.radar_data.config
-            self.algo = FallDetectionAlgo(
-                config.chirp.num_samples, 
-                config.num_chirps, 
-                config.chirp_repetition_time_s, 
-                config.chirp.start_frequency_Hz
-                )
+            self.algo = FallDetectionAlgo(SensorGeometry(config, doppler_zero_pad=1))
+            self.consumer = self.radar_data.subscribe("fall")
+            if self.record_path is not None:
+                self.radar_data.start_recording(self.record_path)
             self.frame_timer.start(100) 
         except Exception as e:
             self.show_error_message(f"Error setting up radar: {e}")
 
     def update_frame(self):
         try:
-            frame = self.radar_data.get_latest_frame()
-            if frame is not None:
-                mat = frame[0, :, :] 
+            for record in self.radar_data.get_new_frames(self.consumer):
+                mat = record.data[0, :, :]
                 fall_detected = self.algo.detect_fall(mat)
                 if fall_detected:
                     self.fall_detected_flag = True
@@ -153,14 +161,6 @@ class FallDetectionApp(QMainWindow):
             self.radar_data.stop()
         event.accept()
 
-def write_ndarray_to_file(arr, file_path):
-    with open(file_path, 'a') as file:
-        file.write('[\n')
-        for row in arr:
-            line = ' '.join(map(str, row)) + '\n'
-            file.write(line)
-        file.write(']\n\n')
-
 def mean_filter(data, kernel_size=3):
     if data.ndim == 1:
         kernel = np.ones(kernel_size) / kernel_size
@@ -174,8 +174,11 @@ def mean_filter(data, kernel_size=3):
     return filtered_data
 
 def main():
-    app = QApplication(sys.argv)
-    ex = FallDetectionApp()
+    parser = argparse.ArgumentParser(description="Fall detection")
+    parser.add_argument('--record', metavar='PATH', help="record the raw frames to PATH")
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
+    ex = FallDetectionApp(record_path=args.record)
     ex.show()
     sys.exit(app.exec_())
 
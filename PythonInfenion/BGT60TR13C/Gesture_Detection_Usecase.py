@@ -3,6 +3,8 @@ import numpy as np
 import time
 from radar_data_acquisition import initialize_radar, get_radar_data
 from helpers.DopplerAlgo import DopplerAlgo
+from helpers.MicroDopplerSpectrogram import MicroDopplerSpectrogram
+from helpers.SensorGeometry import SensorGeometry
 
 def parse_program_arguments(description, def_frate):
     parser = argparse.ArgumentParser(description=description)
@@ -14,19 +16,33 @@ def linear_to_dB(x):
     return 20 * np.log10(abs(x))
 
 class GestureDetectionAlgo:
-    def __init__(self, num_samples, num_chirps, chirp_repetition_time_s, start_frequency_Hz):
+    def __init__(self, num_samples, num_chirps, num_rx_antennas, geometry=None):
+        # geometry: optional SensorGeometry of the profile, gives the velocity
+        # axis of the spectrogram
         self.num_samples = num_samples
         self.num_chirps = num_chirps
-        self.chirp_repetition_time_s = chirp_repetition_time_s
-        self.start_frequency_Hz = start_frequency_Hz
+        self.num_rx_antennas = num_rx_antennas
+        self.doppler = DopplerAlgo(num_samples, num_chirps, num_rx_antennas)
+        # Doppler profiles of the last frames for the analysis of gestures
+        self.spectrogram = MicroDopplerSpectrogram(
+            self.doppler.doppler_fft_size, history=64,
+            velocity_axis=None if geometry is None else geometry.velocity_axis_m_s)
 
-    def detect_gesture(self, radar_data):
-        frame = radar_data.get_latest_frame()
-        if frame is None:
-            return "No Gesture Detected"
-        
-        gesture = self.analyze_frame(frame)
-        return gesture
+    def detect_gesture(self, frame_data, rd_spectrum=None):
+        # rd_spectrum: optional precomputed range-Doppler cube of frame_data,
+        # e.g. FrameProducts.range_doppler() of a ProcessingGraph
+        if frame_data.shape[0] != self.num_rx_antennas:
+            print(f"Unexpected frame shape {frame_data.shape} for {self.num_rx_antennas} antennas")
+            return "No gesture detected"
+
+        if rd_spectrum is None:
+            rd_spectrum = self.doppler.compute_doppler_cube(frame_data)
+        self.spectrogram.update(rd_spectrum)
+        dfft_dbfs = linear_to_dB(rd_spectrum)
+        if np.any(dfft_dbfs > -59):
+            return "Gesture detected"
+        else:
+            return "No gesture detected"
 
 if __name__ == '__main__':
     args = parse_program_arguments(
@@ -36,35 +52,30 @@ if __name__ == '__main__':
     last_detection_time = 0
     detection_suppress_time = 1
 
-    initialize_radar()
+    initialize_radar(profile_names=("gesture",))
     radar_acquisition = get_radar_data()
 
-    while radar_acquisition.get_latest_frame() is None:
-        time.sleep(0.1)
+    consumer = radar_acquisition.subscribe("gesture")
 
     config = radar_acquisition.config
     
     num_rx_antennas = bin(config.chirp.rx_mask).count('1')
 
-    doppler = DopplerAlgo(config.chirp.num_samples, config.num_chirps, num_rx_antennas)
-    gesture_algo = GestureDetectionAlgo(config.chirp.num_samples, config.num_chirps,
-                                         config.chirp_repetition_time_s, config.chirp.start_frequency_Hz)
+    gesture_algo = GestureDetectionAlgo(config.chirp.num_samples, config.num_chirps, num_rx_antennas,
+                                        SensorGeometry(config))
 
     print("Processing radar data. Press Ctrl+C to stop.")
     try:
-        while True:
-            frame_data = radar_acquisition.get_latest_frame()
-            if frame_data is not None:
-                detection_occurred = False
-                for i_ant in range(num_rx_antennas):
-                    mat = frame_data[i_ant, :, :]
-                    
-                    dfft_dbfs = linear_to_dB(doppler.compute_doppler_map(mat, i_ant))
-                    if np.any(dfft_dbfs > -64):
-                        detection_occurred = True
-                        break
-
-                gesture = gesture_algo.detect_gesture(radar_acquisition)
+        while radar_acquisition.running:
+            record = radar_acquisition.wait_for_frame(consumer, timeout=1.0)
+            if record is not None:
+                # one range-Doppler cube per frame, the MTI history of the
+                # DopplerAlgo must see every frame exactly once
+                rd_spectrum = gesture_algo.doppler.compute_doppler_cube(record.data)
+                dfft_dbfs = linear_to_dB(rd_spectrum)
+                detection_occurred = np.any(dfft_dbfs > -64)
+
+                gesture = gesture_algo.detect_gesture(record.data, rd_spectrum=rd_spectrum)
                 
                 if detection_occurred:
                     current_time = time.time()
@@ -72,10 +83,8 @@ if __name__ == '__main__':
                         print("Assistance Required")
                         last_detection_time = current_time
                 
-                if gesture != "No Gesture Detected":
+                if gesture == "Gesture detected":
                     print(f"Detected Gesture: {gesture}")
-            
-            time.sleep(0.01)
 
     except KeyboardInterrupt:
         print("\nProgram terminated by user.")
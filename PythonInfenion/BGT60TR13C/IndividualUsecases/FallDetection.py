@@ -5,64 +5,24 @@ Change the num_chirps from 128 to 64.
 
 '''
 
+import argparse
 import sys
 from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QVBoxLayout, QWidget, QFrame, QMessageBox, QPushButton
 from PyQt5.QtCore import QTimer, Qt
 from PyQt5.QtGui import QFont
 import numpy as np
-from scipy import signal
 from scipy.ndimage import convolve
-from helpers.fft_spectrum import fft_spectrum 
+from helpers.SensorGeometry import SensorGeometry
+from Fall_Detection_Usecase import FallDetectionAlgo
 from radar_data_acquisition import initialize_radar, get_radar_data
 
 
-class FallDetectionAlgo:
-    def __init__(self, num_samples_per_chirp, num_chirps_per_frame, chirp_repetition_time_s, start_frequency_Hz):
-        self.num_samples_per_chirp = num_samples_per_chirp
-        self.num_chirps_per_frame = num_chirps_per_frame
-        self.chirp_repetition_time_s = chirp_repetition_time_s
-        self.start_frequency_Hz = start_frequency_Hz
-        self.window = signal.windows.blackmanharris(num_samples_per_chirp).reshape(1, num_samples_per_chirp)
-        self.fall_threshold = 1
-        self.alpha = 0.4
-        self.slow_avg = None
-        self.fast_avg = None
-        self.first_run = True
-
-    def detect_fall(self, mat):
-        mat_fil = mean_filter(mat)
-        range_fft = fft_spectrum(mat_fil, self.window)
-        fft_spec_abs = abs(range_fft)
-        fft_norm = np.divide(fft_spec_abs.sum(axis=0), self.num_chirps_per_frame)
-        radial_velocity = self.calculate_radial_velocity(mat)
-        fft_norm = radial_velocity
-        if self.first_run:
-            self.slow_avg = fft_norm
-            self.fast_avg = fft_norm
-            self.first_run = False
-        self.slow_avg = self.slow_avg * (1 - self.alpha) + fft_norm * self.alpha
-        self.fast_avg = self.fast_avg * self.alpha + fft_norm * (1 - self.alpha)
-        data = self.fast_avg - self.slow_avg
-        fall_detected = np.max(data) > self.fall_threshold
-        write_ndarray_to_file(mat, 'mat_data.txt')
-        fall_detected = abs(radial_velocity) > 0.6
-        return fall_detected
-
-    def calculate_radial_velocity(self, mat_fil):
-        doppler_fft = np.fft.fftshift(np.fft.fft2(mat_fil, axes=(0, 1)), axes=0)
-        doppler_freq = np.fft.fftfreq(self.num_chirps_per_frame, self.chirp_repetition_time_s)
-        doppler_freq = np.fft.fftshift(doppler_freq)
-        doppler_spectrum = np.abs(doppler_fft).sum(axis=1)
-        doppler_spectrum[32] = 0
-        peak_index = np.argmax(doppler_spectrum)
-        c = 3e8
-        wavelength = c / self.start_frequency_Hz
-        velocity = doppler_freq[peak_index] * wavelength / 2
-        return velocity
-
 class FallDetectionApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, record_path=None):
+        # record_path: optional file the raw frames are recorded to, see
+        #              frame_recording
         super().__init__()
+        self.record_path = record_path
         self.initUI()
         self.algo = None
         self.device = None
@@ -110,24 +70,21 @@ class FallDetectionApp(QMainWindow):
 
     def setup_radar(self):
         try:
-            initialize_radar()
+            initialize_radar(profile_names=("fall",))
             self.radar_data = get_radar_data()
             config = self.radar_data.config
-            self.algo = FallDetectionAlgo(
-                config.chirp.num_samples, 
-                config.num_chirps, 
-                config.chirp_repetition_time_s, 
-                config.chirp.start_frequency_Hz
-                )
+            self.algo = FallDetectionAlgo(SensorGeometry(config, doppler_zero_pad=1))
+            self.consumer = self.radar_data.subscribe("fall")
+            if self.record_path is not None:
+                self.radar_data.start_recording(self.record_path)
             self.frame_timer.start(100) 
         except Exception as e:
             self.show_error_message(f"Error setting up radar: {e}")
 
     def update_frame(self):
         try:
-            frame = self.radar_data.get_latest_frame()
-            if frame is not None:
-                mat = frame[0, :, :] 
+            for record in self.radar_data.get_new_frames(self.consumer):
+                mat = record.data[0, :, :]
                 fall_detected = self.algo.detect_fall(mat)
                 if fall_detected:
                     self.fall_detected_flag = True
@@ -156,14 +113,6 @@ class FallDetectionApp(QMainWindow):
             self.radar_data.stop()
         event.accept()
 
-def write_ndarray_to_file(arr, file_path):
-    with open(file_path, 'a') as file:
-        file.write('[\n')
-        for row in arr:
-            line = ' '.join(map(str, row)) + '\n'
-            file.write(line)
-        file.write(']\n\n')
-
 def mean_filter(data, kernel_size=3):
     if data.ndim == 1:
         kernel = np.ones(kernel_size) / kernel_size
@@ -177,8 +126,11 @@ def mean_filter(data, kernel_size=3):
     return filtered_data
 
 def main():
-    app = QApplication(sys.argv)
-    ex = FallDetectionApp()
+    parser = argparse.ArgumentParser(description="Fall detection")
+    parser.add_argument('--record', metavar='PATH', help="record the raw frames to PATH")
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
+    ex = FallDetectionApp(record_path=args.record)
     ex.show()
     sys.exit(app.exec_())
 
@@ -67,17 +67,13 @@ if __name__ == '__main__':
         for frame_number in range(args.nframes):
             frame_contents = device.get_next_frame()
             frame_data = frame_contents[0]
-            data_all_antennas = []
-            for i_ant in range(0, num_rx_antennas):
-                mat = frame_data[i_ant, :, :]
-                dfft_dbfs = linear_to_dB(doppler.compute_doppler_map(mat, i_ant))
-                if np.any(dfft_dbfs > -59):
-                    current_time = time.time()
-                    if current_time - last_detection_time > detection_suppress_time:
-                        print("Gesture detected")
-                        last_detection_time = current_time
-                        gesture_detected = True
-                data_all_antennas.append(dfft_dbfs)
+            dfft_dbfs = linear_to_dB(doppler.compute_doppler_cube(frame_data))
+            if np.any(dfft_dbfs > -59):
+                current_time = time.time()
+                if current_time - last_detection_time > detection_suppress_time:
+                    print("Gesture detected")
+                    last_detection_time = current_time
+                    gesture_detected = True
 
             if gesture_detected and time.time() - last_detection_time > display_duration:
                 print("No gesture detected")
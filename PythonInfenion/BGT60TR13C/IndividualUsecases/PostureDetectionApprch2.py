@@ -7,6 +7,8 @@ from ifxradarsdk.fmcw import DeviceFmcw
 from ifxradarsdk.fmcw.types import FmcwSimpleSequenceConfig, FmcwSequenceChirp
 from helpers.DigitalBeamForming import DigitalBeamForming
 from helpers.DopplerAlgo import DopplerAlgo
+from helpers.RangeZoom import RangeZoom
+from helpers.fft_spectrum import window_frame
 from binascii import Error
 
 def classify_position(distance, thresholds):
@@ -117,20 +119,17 @@ class RadarGUI:
 
                 doppler = DopplerAlgo(config.chirp.num_samples, config.num_chirps, num_rx_antennas)
                 dbf = DigitalBeamForming(num_rx_antennas, num_beams=40, max_angle_degrees=max_angle_degrees)
+                # refines the range of the strongest beam to 1/16 of a range bin
+                range_zoom = RangeZoom(config.chirp.num_samples, zoom=16)
 
                 while True:
                     try:
                         frame_contents = device.get_next_frame()
                         frame = frame_contents[0]
 
-                        rd_spectrum = np.zeros((config.chirp.num_samples, 2 * config.num_chirps, num_rx_antennas), dtype=complex)
+                        rd_spectrum = doppler.compute_doppler_cube(frame)
                         beam_range_energy = np.zeros((config.chirp.num_samples, 40))
 
-                        for i_ant in range(num_rx_antennas):
-                            mat = frame[i_ant, :, :]
-                            dfft_dbfs = doppler.compute_doppler_map(mat, i_ant)
-                            rd_spectrum[:, :, i_ant] = dfft_dbfs
-
                         rd_beam_formed = dbf.run(rd_spectrum)
                         for i_beam in range(40):
                             doppler_i = rd_beam_formed[:, :, i_beam]
@@ -149,6 +148,12 @@ class RadarGUI:
                         segment_thresholds = thresholds.get(segment_key, {'standing': float('inf'), 'sitting': float('inf'), 'sleeping': float('inf')})
 
                         peak_idx = np.argmax(beam_range_energy[:, max_col])
+
+                        # steer the MTI filtered chirps of all antennas into the
+                        # strongest beam and refine the range peak of that beam
+                        windowed = window_frame(doppler.data_mti, doppler.range_window)
+                        beam_chirps = np.tensordot(dbf.antenna_weights[:, max_col], windowed, axes=(0, 0))
+                        peak_idx = range_zoom.refine(beam_chirps, peak_idx)[0]
                         distance = (peak_idx / config.chirp.num_samples) * max_range_m
                         
                         distance_history.append(distance)
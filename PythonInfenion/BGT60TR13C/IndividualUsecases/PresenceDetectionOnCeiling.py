@@ -125,6 +125,7 @@ def presence_map():
 
         doppler = DopplerAlgo(config.chirp.num_samples, config.num_chirps, num_rx_antennas)
         dbf = DigitalBeamForming(num_rx_antennas, num_beams=80, max_angle_degrees=max_angle_degrees)
+        angle_vector = np.linspace(-max_angle_degrees, max_angle_degrees, 80)
         plot = SegmentPlot(max_angle_degrees, image_path, start_height, end_height, num_bars, margin_ratio)
 
         plt.show(block=False)
@@ -134,21 +135,11 @@ def presence_map():
                 frame_contents = device.get_next_frame()
                 frame = frame_contents[0]
 
-                rd_spectrum = np.zeros((config.chirp.num_samples, 2 * config.num_chirps, num_rx_antennas), dtype=complex)
-                beam_range_energy = np.zeros((config.chirp.num_samples, 80))
+                rd_spectrum = doppler.compute_doppler_cube(frame)
 
-                for i_ant in range(num_rx_antennas):
-                    mat = frame[i_ant, :, :]
-                    dfft_dbfs = doppler.compute_doppler_map(mat, i_ant)
-                    rd_spectrum[:, :, i_ant] = dfft_dbfs
-
-                rd_beam_formed = dbf.run(rd_spectrum)
-                for i_beam in range(80):
-                    doppler_i = rd_beam_formed[:, :, i_beam]
-                    beam_range_energy[:, i_beam] += np.linalg.norm(doppler_i, axis=1) / np.sqrt(80)
-
-                max_row, max_col = np.unravel_index(beam_range_energy.argmax(), beam_range_energy.shape)
-                angle_degrees = np.linspace(-max_angle_degrees, max_angle_degrees, 80)[max_col]
+                # strongest beam by a coarse-to-fine search instead of forming all 80 beams
+                max_row, max_col, _ = dbf.strongest_beam(rd_spectrum)
+                angle_degrees = angle_vector[max_col]
 
                 plot.update(angle_degrees)
 
@@ -123,14 +123,9 @@ def presence_map():
                 frame_contents = device.get_next_frame()
                 frame = frame_contents[0]
 
-                rd_spectrum = np.zeros((config.chirp.num_samples, 2 * config.num_chirps, num_rx_antennas), dtype=complex)
+                rd_spectrum = doppler.compute_doppler_cube(frame)
                 beam_range_energy = np.zeros((config.chirp.num_samples, num_beams))
 
-                for i_ant in range(num_rx_antennas):
-                    mat = frame[i_ant, :, :]
-                    dfft_dbfs = doppler.compute_doppler_map(mat, i_ant)
-                    rd_spectrum[:, :, i_ant] = dfft_dbfs
-
                 rd_beam_formed = dbf.run(rd_spectrum)
                 for i_beam in range(num_beams):
                     doppler_i = rd_beam_formed[:, :, i_beam]
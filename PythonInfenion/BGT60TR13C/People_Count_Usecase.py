@@ -1,10 +1,21 @@
+import argparse
+import multiprocessing
+import os
+import time
 import numpy as np
 from scipy.signal import find_peaks
 from collections import namedtuple
-from scipy import signal
+from frame_bus import run_frame_worker
+from helpers import constant_cache, precision
 from helpers.fft_spectrum import fft_spectrum
-from sklearn.cluster import DBSCAN
-from radar_data_acquisition import initialize_radar, get_radar_data
+from helpers.grid_dbscan import cluster_centroids, grid_dbscan
+from helpers.SensorGeometry import SensorGeometry
+from helpers.TargetTracker import TargetTracker
+from radar_data_acquisition import PROFILES, initialize_radar, get_radar_data
+
+# Result of PresenceAlgo.presence for one frame. peaks are range bins counted
+# from detect_start_sample, data is the fast minus slow average range profile.
+PresenceState = namedtuple("PresenceState", ["presence", "num_persons", "peaks", "data"])
 
 class PresenceAlgo:
     def __init__(self, num_samples_per_chirp, num_chirps_per_frame):
@@ -23,17 +34,23 @@ class PresenceAlgo:
         self.presence_status = False
         self.first_run = True
 
-        self.window = signal.windows.blackmanharris(num_samples_per_chirp).reshape(1, num_samples_per_chirp)
+        self.window = constant_cache.window("blackmanharris", num_samples_per_chirp).reshape(1, num_samples_per_chirp)
+        self.range_fft = np.empty((num_chirps_per_frame, num_samples_per_chirp), dtype=precision.complex_dtype())
 
-    def presence(self, mat):
+    def presence(self, mat, range_profile=None):
+        # range_profile: optional precomputed mean magnitude of the range FFT
+        # of mat, e.g. FrameProducts.range_profile() of a ProcessingGraph
         alpha_slow = self.alpha_slow
         alpha_med = self.alpha_med
         alpha_fast = self.alpha_fast
 
-        range_fft = fft_spectrum(mat, self.window)
+        if range_profile is None:
+            range_fft = fft_spectrum(mat, self.window, self.range_fft)
 
-        fft_spec_abs = abs(range_fft)
-        fft_norm = np.divide(fft_spec_abs.sum(axis=0), self.num_chirps_per_frame)
+            fft_spec_abs = abs(range_fft)
+            fft_norm = np.divide(fft_spec_abs.sum(axis=0), self.num_chirps_per_frame)
+        else:
+            fft_norm = range_profile
 
         if self.first_run:  
             self.slow_avg = fft_norm
@@ -54,7 +71,7 @@ class PresenceAlgo:
         peaks, _ = find_peaks(data[self.detect_start_sample:self.detect_end_sample], height=self.threshold_presence)
         num_persons = len(peaks)
 
-        return namedtuple("state", ["presence", "num_persons", "peaks", "data"])(self.presence_status, num_persons, peaks, data)
+        return PresenceState(self.presence_status, num_persons, peaks, data)
 
     def estimate_aoa(self, mat, peaks, antenna_distance, wavelength):
         num_antennas = mat.shape[0]
@@ -74,60 +91,77 @@ class PresenceAlgo:
 
         return aoa_estimates
     
-    def cluster_peaks(self, peaks, aoa_estimates):
-        features = np.column_stack((peaks, aoa_estimates))
+    def cluster_peaks(self, positions, epsilon=0.2):
+        # Merge detections closer than epsilon (in m) into one person, e.g.
+        # neighbouring peaks of the range profile caused by the same body.
+        # Returns the mean position of every group (num_persons x 2).
+        #
+        # The peaks of one frame are clustered in metres, so epsilon does not
+        # depend on the range resolution: 0.2 m is 4 range bins of the
+        # presence profile and below the distance of two persons side by
+        # side. A person gives only one to three peaks per frame, so every
+        # peak may start a group (min_samples=1). Single false peaks are
+        # rejected by the tracker, which confirms a person after confirm_hits
+        # frames.
+        labels = grid_dbscan(positions, eps=epsilon, min_samples=1)
+
+        return cluster_centroids(positions, labels)
+
+class PeopleCounter:
+    """Presence, number of persons and tracked persons of a frame sequence"""
+
+    def __init__(self, config):
+        self.algo = PresenceAlgo(config.chirp.num_samples, config.num_chirps)
+
+        self.antenna_distance = 0.0025
+        self.geometry = SensorGeometry(config)
+        self.wavelength = self.geometry.wavelength_m
+
+        # persons are tracked in the x-y plane, tracks keep their identity across
+        # frames instead of clustering the peaks of every frame from scratch
+        self.tracker = TargetTracker(num_dims=2, dt=config.frame_repetition_time_s, measurement_noise=0.1)
+
+    def update(self, frame_contents):
+        """Process the next frame (num_rx x num_chirps x num_samples)
+
+        Returns:
+            - PresenceState of the frame and the number of tracked persons
+        """
+        algo = self.algo
+
+        # the peaks are detected once per frame on the first antenna,
+        # every antenna sees the same persons and only contributes to
+        # their angle of arrival
+        mat = frame_contents[0]
+
+        state = algo.presence(mat)
 
-        epsilon = 0.2 
-        min_samples = 7
-        db = DBSCAN(eps=epsilon, min_samples=min_samples).fit(features)
+        aoa_estimates = []
+        if state.num_persons > 0:
+            aoa_estimates = algo.estimate_aoa(frame_contents, state.peaks, self.antenna_distance, self.wavelength)
 
-        labels = db.labels_
+        # position of every peak from its range and mean angle of arrival
+        range_m = self.geometry.range_of_bin(np.asarray(state.peaks, dtype=float) + algo.detect_start_sample)
+        angle = np.radians([np.mean(aoa) for aoa in aoa_estimates])
+        positions = np.column_stack((range_m * np.cos(angle), range_m * np.sin(angle)))
+        self.tracker.update(algo.cluster_peaks(positions))
 
-        return labels
+        return state, self.tracker.num_confirmed()
 
-def run_presence_detection(radar_data):
-    config = radar_data.config
-    algo = PresenceAlgo(config.chirp.num_samples, config.num_chirps)
+def print_people_count(state, num_tracked):
+    print(f"Presence: {state.presence}")
+    print(f"Number of persons: {state.num_persons}")
+    print(f"Number of tracked persons: {num_tracked}")
 
-    antenna_distance = 0.0025
-    wavelength = 3e8 / ((config.chirp.start_frequency_Hz + config.chirp.end_frequency_Hz) / 2)
+def run_presence_detection(radar_data):
+    counter = PeopleCounter(radar_data.config)
 
-    while True:
+    consumer = radar_data.subscribe("people_count")
+    while radar_data.running:
         try:
-            frame_contents = radar_data.get_latest_frame()
-            if frame_contents is not None:
-                num_rx_antennas = frame_contents.shape[0]
-                presence_detected = False
-                total_num_persons = 0
-
-                aoa_estimates_all = []
-                peaks_all = []
-
-                for i in range(num_rx_antennas):
-                    frame = frame_contents[i]
-
-                    mat = frame[0, :, :]
-
-                    state = algo.presence(mat)
-
-                    if state.presence:
-                        presence_detected = True
-
-                    total_num_persons += state.num_persons
-
-                    if state.num_persons > 0:
-                        aoa_estimates = algo.estimate_aoa(frame_contents, state.peaks, antenna_distance, wavelength)
-                        aoa_estimates_all.extend(aoa_estimates)
-                        peaks_all.extend(state.peaks)
-                    
-                    if len(peaks_all) > 0 and len(aoa_estimates_all) > 0:
-                       cluster_labels = algo.cluster_peaks(peaks_all, aoa_estimates_all)
-                       num_clusters = len(set(cluster_labels)) - (1 if -1 in cluster_labels else 0)
-                    else:
-                       num_clusters = 0
-
-                print(f"Presence: {presence_detected}")
-                print(f"Number of persons: {total_num_persons}")
+            record = radar_data.wait_for_frame(consumer, timeout=1.0)
+            if record is not None:
+                print_people_count(*counter.update(record.data))
 
         except KeyboardInterrupt:
             print("Program stopped by user.")
@@ -136,13 +170,44 @@ def run_presence_detection(radar_data):
             print(f"Error occurred: {e}")
             break
 
-if __name__ == "main":
+def people_count_worker(bus_name, profile_name="presence", stop_event=None):
+    # Entry point of a worker process counting people in the frames of a
+    # SharedFrameBus, which has to carry only frames of profile_name
+    counter = PeopleCounter(PROFILES[profile_name])
+
+    def process_frame(sequence, timestamp, data):
+        print_people_count(*counter.update(data))
+
+    processed, torn = run_frame_worker(bus_name, process_frame, stop_event)
+    print(f"People count worker processed {processed} frames, dropped {torn} torn frames")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count people in front of the radar")
+    parser.add_argument('--worker', action='store_true',
+                        help="count in a separate process reading the frames from shared memory")
+    parser.add_argument('--replay', help="replay a recorded session instead of using the sensor")
+    args = parser.parse_args()
 
     radar_data = None
     try:
-        initialize_radar()
-        radar_data = get_radar_data()
-        run_presence_detection(radar_data)
+        if args.worker:
+            initialize_radar(replay_path=args.replay, shared_memory_name=f"people_count_{os.getpid()}")
+            radar_data = get_radar_data()
+            stop_event = multiprocessing.Event()
+            worker = multiprocessing.Process(target=people_count_worker,
+                                             args=(radar_data.frame_bus.name, "presence", stop_event))
+            worker.start()
+            try:
+                while radar_data.running and worker.is_alive():
+                    time.sleep(0.5)
+            except KeyboardInterrupt:
+                print("Program stopped by user.")
+            stop_event.set()
+            worker.join()
+        else:
+            initialize_radar(replay_path=args.replay)
+            radar_data = get_radar_data()
+            run_presence_detection(radar_data)
     except Exception as e:
         print(f"Error initializing radar: {e}")
     finally:
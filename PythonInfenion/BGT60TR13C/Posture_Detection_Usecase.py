@@ -3,10 +3,18 @@ import threading
 import numpy as np
 from scipy.signal import find_peaks
 from collections import namedtuple
-from scipy import signal
-from helpers.fft_spectrum import fft_spectrum
+from helpers import constant_cache, precision
+from helpers.fft_spectrum import fft_spectrum, window_frame
+from helpers.RangeZoom import RangeZoom
+from helpers.SensorGeometry import SensorGeometry
 from radar_data_acquisition import initialize_radar, get_radar_data
 
+# Result of PostureDetectionAlgo.posture for one frame. peaks are range bins
+# counted from detect_start_sample, refined_peaks the same peaks with sub-bin
+# precision (refined on the chirp data without static clutter), data is the
+# fast minus slow average range profile.
+PostureState = namedtuple("PostureState", ["presence", "num_persons", "peaks", "data", "refined_peaks"])
+
 class PostureDetectionAlgo:
     def __init__(self, num_samples_per_chirp, num_chirps_per_frame):
         self.num_samples_per_chirp = num_samples_per_chirp
@@ -24,21 +32,32 @@ class PostureDetectionAlgo:
         self.presence_status = False
         self.first_run = True
 
-        self.window = signal.windows.blackmanharris(num_samples_per_chirp).reshape(1, num_samples_per_chirp)
+        self.window = constant_cache.window("blackmanharris", num_samples_per_chirp).reshape(1, num_samples_per_chirp)
+        self.range_fft = np.empty((num_chirps_per_frame, num_samples_per_chirp), dtype=precision.complex_dtype())
+
+        # refines the peaks to 1/16 of a range bin around their coarse position
+        self.range_zoom = RangeZoom(num_samples_per_chirp, zoom=16)
 
-    def posture(self, mat):
+    def posture(self, mat, range_profile=None):
+        # range_profile: optional precomputed mean magnitude of the range FFT
+        # of mat, e.g. FrameProducts.range_profile() of a ProcessingGraph
         alpha_slow = self.alpha_slow
         alpha_med = self.alpha_med
         alpha_fast = self.alpha_fast
 
-        range_fft = fft_spectrum(mat, self.window)
+        if range_profile is None:
+            range_fft = fft_spectrum(mat, self.window, self.range_fft)
 
-        fft_spec_abs = abs(range_fft)
-        fft_norm = np.divide(fft_spec_abs.sum(axis=0), self.num_chirps_per_frame)
+            fft_spec_abs = abs(range_fft)
+            fft_norm = np.divide(fft_spec_abs.sum(axis=0), self.num_chirps_per_frame)
+        else:
+            fft_norm = range_profile
 
         if self.first_run: 
             self.slow_avg = fft_norm
             self.fast_avg = fft_norm
+            # static clutter of the chirp data, a slow average like slow_avg
+            self.clutter = np.array(mat, dtype=precision.float_dtype())
             self.first_run = False
 
         if not self.presence_status:
@@ -49,13 +68,23 @@ class PostureDetectionAlgo:
         self.slow_avg = self.slow_avg * (1 - alpha_used) + fft_norm * alpha_used
         self.fast_avg = self.fast_avg * (1 - alpha_fast) + fft_norm * alpha_fast
         data = self.fast_avg - self.slow_avg
+        self.clutter *= 1 - alpha_used
+        self.clutter += alpha_used * mat
 
         self.presence_status = np.max(data[self.detect_start_sample:self.detect_end_sample]) > self.threshold_presence
         
         peaks, _ = find_peaks(data[self.detect_start_sample:self.detect_end_sample], height=self.threshold_presence)
         num_persons = len(peaks)
+
+        # fractional peak positions, counted like peaks
+        refined_peaks = peaks.astype(float)
+        if num_persons > 0:
+            # the peaks are detected on the moving part of the range profile,
+            # so they are refined on the chirp data minus the static clutter
+            windowed = window_frame(mat - self.clutter, self.window)
+            refined_peaks = self.range_zoom.refine(windowed, peaks + self.detect_start_sample) - self.detect_start_sample
         
-        return namedtuple("state", ["presence", "num_persons", "peaks", "data"])(self.presence_status, num_persons, peaks, data)
+        return PostureState(self.presence_status, num_persons, peaks, data, refined_peaks)
 
 class RadarGUI:
     def __init__(self, root):
@@ -88,16 +117,19 @@ class RadarGUI:
 
     def run_detection(self):
         try:
-            initialize_radar()
+            initialize_radar(profile_names=("posture",))
             radar_data = get_radar_data()
             config = radar_data.config
 
             algo = PostureDetectionAlgo(config.chirp.num_samples, config.num_chirps)
+            geometry = SensorGeometry(config)
 
-            while True:
+            consumer = radar_data.subscribe("posture")
+            while radar_data.running:
                 try:
-                    frame = radar_data.get_latest_frame()
-                    if frame is not None:
+                    record = radar_data.wait_for_frame(consumer, timeout=1.0)
+                    if record is not None:
+                        frame = record.data
                         movement_detected = False
 
                         for i_ant in range(frame.shape[0]):
@@ -107,9 +139,9 @@ class RadarGUI:
                             if state.presence:
                                 movement_detected = True
                                 if len(state.peaks) > 0:
-                                    peak_idx = state.peaks[0]
-                                    max_range_m = radar_data.device.metrics_from_sequence(radar_data.device.get_acquisition_sequence().loop.sub_sequence.contents).max_range_m
-                                    distance = (peak_idx / config.chirp.num_samples) * max_range_m
+                                    # refined_peaks are counted from detect_start_sample
+                                    peak_idx = state.refined_peaks[0] + algo.detect_start_sample
+                                    distance = geometry.range_of_bin(peak_idx)
 
                                     if distance <= 0.50:
                                         self.root.after(0, self.update_status, "Standing")
@@ -2,9 +2,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 from collections import deque
 from matplotlib.image import imread
-from helpers.DigitalBeamForming import DigitalBeamForming
-from helpers.DopplerAlgo import DopplerAlgo
-import time
+from helpers.ProcessingGraph import ProcessingGraph
 from PyQt5.QtCore import QObject, pyqtSignal, QTimer
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
@@ -67,7 +65,7 @@ class SegmentPlot(FigureCanvas):
         self.draw()
 
 class PresenceDetection:
-    def __init__(self, max_angle_degrees: float, image_path: str, start_height: float, end_height: float, num_bars: int, margin_ratio: float):
+    def __init__(self, max_angle_degrees: float, image_path: str, start_height: float, end_height: float, num_bars: int, margin_ratio: float, graph: ProcessingGraph = None):
         self.max_angle_degrees = max_angle_degrees
         self.image_path = image_path
         self.start_height = start_height
@@ -80,8 +78,13 @@ class PresenceDetection:
         self.num_chirps = 64
         self.num_rx_antennas = 2
         
-        self.doppler = DopplerAlgo(self.num_samples, self.num_chirps, self.num_rx_antennas)
-        self.dbf = DigitalBeamForming(self.num_rx_antennas, num_beams=80, max_angle_degrees=max_angle_degrees)
+        # graph of the presence profile, may be shared with other usecases
+        if graph is None:
+            graph = ProcessingGraph(self.num_samples, self.num_chirps, self.num_rx_antennas,
+                                    num_beams=80, max_angle_degrees=max_angle_degrees,
+                                    range_gate=slice(self.num_samples // 8, (3 * self.num_samples) // 4))
+        self.graph = graph
+        self.angle_vector = np.linspace(-graph.max_angle_degrees, graph.max_angle_degrees, graph.num_beams)
         
         self.plot = None
         self.signals = PresenceDetectionSignals()
@@ -91,22 +94,12 @@ class PresenceDetection:
         self.signals.update_plot.connect(self.plot.update_angle)
         return self.plot
 
-    def process_frame(self, frame):
-        rd_spectrum = np.zeros((self.num_samples, 2 * self.num_chirps, self.num_rx_antennas), dtype=complex)
-        beam_range_energy = np.zeros((self.num_samples, 80))
-
-        for i_ant in range(self.num_rx_antennas):
-            mat = frame[i_ant, :, :]
-            dfft_dbfs = self.doppler.compute_doppler_map(mat, i_ant)
-            rd_spectrum[:, :, i_ant] = dfft_dbfs
-
-        rd_beam_formed = self.dbf.run(rd_spectrum)
-        for i_beam in range(80):
-            doppler_i = rd_beam_formed[:, :, i_beam]
-            beam_range_energy[:, i_beam] += np.linalg.norm(doppler_i, axis=1) / np.sqrt(80)
-
-        max_idx = np.unravel_index(beam_range_energy.argmax(), beam_range_energy.shape)
-        angle_degrees = np.linspace(-self.max_angle_degrees, self.max_angle_degrees, 80)[max_idx[1]]
+    def process_frame(self, record):
+        # only the strongest beam is needed, a coarse-to-fine search avoids
+        # forming all beams
+        range_doppler = self.graph.products(record).range_doppler()
+        _, beam, _ = self.graph.dbf.strongest_beam(range_doppler)
+        angle_degrees = self.angle_vector[beam]
 
         return angle_degrees
 
@@ -117,21 +110,22 @@ class PresenceDetection:
             print("Radar data acquisition not initialized")
             return
         
+        consumer = radar_data.subscribe("presence", profile="presence")
         while radar_data.running:
-            frame = radar_data.get_latest_frame()
-            if frame is not None:
-                angle_degrees = self.process_frame(frame)
+            record = radar_data.wait_for_frame(consumer, timeout=1.0)
+            if record is not None:
+                angle_degrees = self.process_frame(record)
                 self.signals.update_plot.emit(angle_degrees)
-            time.sleep(0.1)
 
-def run_presence_detection():
+def run_presence_detection(graph=None):
     presence_detection = PresenceDetection(
         max_angle_degrees=60,
         image_path='PythonInfenion/BGT60TR13C/assets/topviewbkgcomp.jpg',
         start_height=0.13,
         end_height=0.8785,
         num_bars=8,
-        margin_ratio=0.13
+        margin_ratio=0.13,
+        graph=graph
     )
     
     return presence_detection
@@ -0,0 +1,224 @@
+import sys
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+# Layout of the shared memory block:
+#   bus header (64 bytes) | slot 0 | slot 1 | ... | slot num_slots-1
+# Every slot starts with a 64 byte header followed by the frame data.
+# A slot's sequence number is cleared while the slot is written and set last,
+# so read never maps a slot that is being written. Readers map frames without
+# copying, though: once the writer wraps around the ring, it overwrites the
+# slot while the reader may still be using the frame. A reader that keeps
+# state across frames copies the frame out of the slot and checks
+# SharedFrameReader.is_current after the copy, a frame overwritten during
+# the copy is dropped before it reaches the state (run_frame_worker does).
+BUS_MAGIC = 0x52414442  # "RADB"
+
+BUS_HEADER_DTYPE = np.dtype({
+    "names": ["magic", "num_slots", "slot_size", "sequence"],
+    "formats": ["<u4", "<u4", "<u8", "<u8"],
+    "offsets": [0, 4, 8, 16],
+    "itemsize": 64,
+})
+
+SLOT_HEADER_DTYPE = np.dtype({
+    "names": ["sequence", "timestamp", "dtype", "ndim", "shape"],
+    "formats": ["<u8", "<f8", "S8", "<u4", ("<u8", (4,))],
+    "offsets": [0, 8, 16, 24, 32],
+    "itemsize": 64,
+})
+
+MAX_NDIM = 4
+
+
+def frame_nbytes(config, itemsize=8):
+    # Size of one raw frame (num_rx x num_chirps x num_samples) for a config
+    num_rx_antennas = bin(config.chirp.rx_mask).count('1')
+    return num_rx_antennas * config.num_chirps * config.chirp.num_samples * itemsize
+
+
+class SharedFrameBus:
+    """Publishes frames into a shared memory ring buffer
+
+    Workers in other processes attach to the ring by name with
+    SharedFrameReader and map frames without pickling or copying.
+    """
+
+    def __init__(self, name, frame_size, num_slots=8):
+        """Create the shared memory ring
+
+        Parameters:
+            - name:         name of the shared memory block, None picks a
+                            unique name (available as .name)
+            - frame_size:   maximum size of a frame in bytes
+            - num_slots:    number of frames kept in the ring
+        """
+        self.num_slots = num_slots
+        # keep frame data 64 byte aligned
+        self.slot_size = SLOT_HEADER_DTYPE.itemsize + -(-frame_size // 64) * 64
+        size = BUS_HEADER_DTYPE.itemsize + num_slots * self.slot_size
+
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = self.shm.name
+
+        self.header = np.ndarray((), dtype=BUS_HEADER_DTYPE, buffer=self.shm.buf)
+        self.header["magic"] = BUS_MAGIC
+        self.header["num_slots"] = num_slots
+        self.header["slot_size"] = self.slot_size
+        self.header["sequence"] = 0
+
+    def publish(self, sequence, timestamp, frame):
+        """Copy a frame into the slot of its sequence number"""
+        frame = np.asarray(frame)
+        if frame.ndim > MAX_NDIM or frame.nbytes > self.slot_size - SLOT_HEADER_DTYPE.itemsize:
+            raise ValueError(f"Frame of shape {frame.shape} does not fit into the frame bus")
+
+        slot_header, slot_data = _slot(self.shm.buf, self.slot_size, sequence % self.num_slots)
+        slot_header["sequence"] = 0
+        slot_header["timestamp"] = timestamp
+        slot_header["dtype"] = frame.dtype.str.encode()
+        slot_header["ndim"] = frame.ndim
+        slot_header["shape"] = frame.shape + (0,) * (MAX_NDIM - frame.ndim)
+        np.ndarray(frame.shape, dtype=frame.dtype, buffer=slot_data)[...] = frame
+        slot_header["sequence"] = sequence
+        self.header["sequence"] = sequence
+
+    def close(self):
+        del self.header
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SharedFrameReader:
+    """Reads frames published by a SharedFrameBus, usually in another process"""
+
+    def __init__(self, name):
+        self.shm = _attach(name)
+        self.header = np.ndarray((), dtype=BUS_HEADER_DTYPE, buffer=self.shm.buf)
+        if self.header["magic"] != BUS_MAGIC:
+            raise ValueError(f"Shared memory block {name} is not a frame bus")
+        self.num_slots = int(self.header["num_slots"])
+        self.slot_size = int(self.header["slot_size"])
+
+    def latest_sequence(self):
+        return int(self.header["sequence"])
+
+    def read(self, sequence):
+        """Map the frame with the given sequence number
+
+        Returns:
+            - (sequence, timestamp, data) where data is a read-only view into
+              shared memory, or None if the frame was already overwritten.
+              The view stays valid until the writer wraps around the ring,
+              see is_current.
+        """
+        slot_header, slot_data = _slot(self.shm.buf, self.slot_size, sequence % self.num_slots)
+        if slot_header["sequence"] != sequence:
+            return None
+        ndim = int(slot_header["ndim"])
+        shape = tuple(int(n) for n in slot_header["shape"][:ndim])
+        data = np.ndarray(shape, dtype=np.dtype(slot_header["dtype"].item().decode()), buffer=slot_data)
+        data.flags.writeable = False
+        timestamp = float(slot_header["timestamp"])
+        # the writer may have started on this slot while we were reading its
+        # header, then shape, dtype and timestamp may be of the next frame
+        if slot_header["sequence"] != sequence:
+            return None
+        return sequence, timestamp, data
+
+    def is_current(self, sequence):
+        """True as long as the frame with this sequence number was not overwritten"""
+        slot_header, _ = _slot(self.shm.buf, self.slot_size, sequence % self.num_slots)
+        return slot_header["sequence"] == sequence
+
+    def wait_for_frame(self, last_sequence, timeout=None, poll_interval=0.005):
+        """Wait for the next frame after last_sequence and map it
+
+        Frames that were overwritten before they could be read are skipped.
+
+        Returns:
+            - (sequence, timestamp, data) as from read, or None on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            latest = self.latest_sequence()
+            if latest > last_sequence:
+                oldest = max(last_sequence + 1, latest - self.num_slots + 1)
+                for sequence in range(oldest, latest + 1):
+                    frame = self.read(sequence)
+                    if frame is not None:
+                        return frame
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+
+    def close(self):
+        del self.header
+        self.shm.close()
+
+
+def run_frame_worker(bus_name, process_frame, stop_event=None, timeout=1.0):
+    """Worker loop for a usecase running in its own process
+
+    Every frame is copied out of shared memory before it is processed, so
+    the writer can reuse the slot while process_frame runs. A frame the
+    writer overwrote during the copy is torn: it is dropped and counted
+    instead of being processed, the state of the usecase never sees it.
+
+    Parameters:
+        - bus_name:      name of the SharedFrameBus to attach to
+        - process_frame: called as process_frame(sequence, timestamp, data)
+                         for every complete frame, data is a private copy
+        - stop_event:    optional multiprocessing.Event ending the loop
+        - timeout:       how often stop_event is checked, in seconds
+
+    Returns:
+        - (number of processed frames, number of torn frames)
+    """
+    reader = SharedFrameReader(bus_name)
+    last_sequence = reader.latest_sequence()
+    processed = 0
+    torn = 0
+    try:
+        while stop_event is None or not stop_event.is_set():
+            frame = reader.wait_for_frame(last_sequence, timeout=timeout)
+            if frame is not None:
+                sequence, timestamp, data = frame
+                last_sequence = sequence
+                data = np.array(data)
+                frame = None
+                if not reader.is_current(sequence):
+                    torn += 1
+                    continue
+                process_frame(sequence, timestamp, data)
+                processed += 1
+    finally:
+        frame = None
+        reader.close()
+    return processed, torn
+
+
+def _slot(buf, slot_size, index):
+    start = BUS_HEADER_DTYPE.itemsize + index * slot_size
+    data_start = start + SLOT_HEADER_DTYPE.itemsize
+    header = np.ndarray((), dtype=SLOT_HEADER_DTYPE, buffer=buf, offset=start)
+    return header, buf[data_start:start + slot_size]
+
+
+def _attach(name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    if sys.platform == "win32":
+        return shared_memory.SharedMemory(name=name)
+
+    # Before Python 3.13 attaching registers the block with the resource
+    # tracker, which would unlink it when this process exits. Only the
+    # SharedFrameBus owning the block may unlink it.
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None if rtype == "shared_memory" else register(name, rtype)
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
@@ -0,0 +1,250 @@
+import json
+import os
+import struct
+from types import SimpleNamespace
+import numpy as np
+
+# Layout of a recording file:
+#   magic (8 bytes) | header length (4 bytes) | JSON header | padding up to
+#   HEADER_ALIGN | chunk 0 | chunk 1 | ...
+# Every chunk has the same size and holds an index table for frames_per_chunk
+# frames followed by frames_per_chunk frame slots, so the whole data area can
+# be mapped as an array of chunks. Index entries of frames not written yet
+# have sequence 0.
+#
+# A recording holds the frames of one or more acquisition profiles. The
+# header lists every profile with its config and frame shape, the index
+# entry of a frame holds the position of its profile in that list. Frame
+# slots are as large as the largest frame, smaller frames use the start of
+# their slot.
+#
+# RADREC01 files (one profile, no profile in the index) can still be read.
+RECORDING_MAGIC = b"RADREC02"
+RECORDING_MAGIC_V1 = b"RADREC01"
+HEADER_ALIGN = 4096
+
+INDEX_DTYPE = np.dtype([("sequence", "<u8"), ("timestamp", "<f8"), ("offset", "<u8"), ("profile", "<u4"),
+                        ("reserved", "<u4")])
+INDEX_DTYPE_V1 = np.dtype([("sequence", "<u8"), ("timestamp", "<f8"), ("offset", "<u8")])
+
+CONFIG_FIELDS = ("frame_repetition_time_s", "chirp_repetition_time_s", "num_chirps", "tdm_mimo")
+CHIRP_FIELDS = ("start_frequency_Hz", "end_frequency_Hz", "sample_rate_Hz", "num_samples", "rx_mask",
+                "tx_mask", "tx_power_level", "lp_cutoff_Hz", "hp_cutoff_Hz", "if_gain_dB")
+
+
+def config_to_dict(config):
+    # FmcwSimpleSequenceConfig -> plain dict
+    config_dict = {field: getattr(config, field) for field in CONFIG_FIELDS if hasattr(config, field)}
+    config_dict["chirp"] = {field: getattr(config.chirp, field) for field in CHIRP_FIELDS if hasattr(config.chirp, field)}
+    return config_dict
+
+
+def config_from_dict(config_dict):
+    # plain dict -> FmcwSimpleSequenceConfig, or a namespace with the same
+    # attributes if the radar SDK is not installed
+    chirp_dict = dict(config_dict["chirp"])
+    fields = {key: value for key, value in config_dict.items() if key != "chirp"}
+    try:
+        from ifxradarsdk.fmcw.types import FmcwSimpleSequenceConfig, FmcwSequenceChirp
+    except ImportError:
+        return SimpleNamespace(chirp=SimpleNamespace(**chirp_dict), **fields)
+    return FmcwSimpleSequenceConfig(chirp=FmcwSequenceChirp(**chirp_dict), **fields)
+
+
+def frame_shape_of(config):
+    # num_rx_antennas x num_chirps x num_samples of the frames of a config
+    num_rx_antennas = bin(config.chirp.rx_mask).count('1')
+    return (num_rx_antennas, config.num_chirps, config.chirp.num_samples)
+
+
+def _chunk_layout(index_dtype, frame_size, frames_per_chunk):
+    # frame_size: size of a frame slot in bytes
+    index_size = -(-frames_per_chunk * index_dtype.itemsize // 64) * 64
+    chunk_dtype = np.dtype({
+        "names": ["index", "frames"],
+        "formats": [(index_dtype, (frames_per_chunk,)), (np.uint8, (frames_per_chunk, frame_size))],
+        "offsets": [0, index_size],
+        "itemsize": index_size + frames_per_chunk * frame_size,
+    })
+    return chunk_dtype, index_size
+
+
+class FrameRecorder:
+    """Writes raw frames into a chunked binary recording"""
+
+    def __init__(self, path, config, frame_shape=None, dtype="float32", frames_per_chunk=64, profiles=None):
+        """Create a recording
+
+        Parameters:
+            - path:             file to write, an existing file is replaced
+            - config:           FmcwSimpleSequenceConfig stored in the header,
+                                may be None if profiles are given
+            - frame_shape:      num_rx_antennas x num_chirps x num_samples of
+                                a single profile recording, derived from
+                                config if not given
+            - dtype:            data type frames are stored with
+            - frames_per_chunk: number of frames per chunk
+            - profiles:         dict of profile name -> config for recording
+                                the frames of several acquisition profiles
+        """
+        if profiles is None:
+            profiles = {"default": config}
+            frame_shapes = {"default": tuple(frame_shape) if frame_shape is not None else frame_shape_of(config)}
+        else:
+            frame_shapes = {name: frame_shape_of(profile_config) for name, profile_config in profiles.items()}
+        self.profiles = dict(profiles)
+        self.frame_shapes = frame_shapes
+        self.profile_ids = {name: profile_id for profile_id, name in enumerate(profiles)}
+        # shape of the frames of the first profile for single profile users
+        self.frame_shape = next(iter(frame_shapes.values()))
+        self.dtype = np.dtype(dtype)
+        self.frames_per_chunk = frames_per_chunk
+        self.frame_size = max(int(np.prod(shape)) for shape in frame_shapes.values()) * self.dtype.itemsize
+        self.chunk_dtype, self.index_size = _chunk_layout(INDEX_DTYPE, self.frame_size, frames_per_chunk)
+
+        header = json.dumps({
+            "profiles": [{"name": name, "config": config_to_dict(profile_config), "frame_shape": frame_shapes[name]}
+                         for name, profile_config in profiles.items()],
+            "dtype": self.dtype.str,
+            "frames_per_chunk": frames_per_chunk,
+            "frame_size": self.frame_size,
+        }).encode()
+        self.data_offset = -(-(len(RECORDING_MAGIC) + 4 + len(header)) // HEADER_ALIGN) * HEADER_ALIGN
+
+        self.file = open(path, "wb+")
+        self.file.write(RECORDING_MAGIC + struct.pack("<I", len(header)) + header)
+        self.file.truncate(self.data_offset)
+        self.num_frames = 0
+
+    def write(self, sequence, timestamp, frame, profile=None):
+        """Append a frame acquired with profile (default: the first profile)"""
+        if profile is None:
+            profile = next(iter(self.profiles))
+        frame = np.ascontiguousarray(frame, dtype=self.dtype)
+        if frame.shape != self.frame_shapes[profile]:
+            raise ValueError(f"Frame of shape {frame.shape} does not match shape {self.frame_shapes[profile]} "
+                             f"of profile {profile}")
+
+        chunk, slot = divmod(self.num_frames, self.frames_per_chunk)
+        chunk_offset = self.data_offset + chunk * self.chunk_dtype.itemsize
+        if slot == 0:
+            # reserve the whole chunk, unused index entries stay zero
+            self.file.truncate(chunk_offset + self.chunk_dtype.itemsize)
+
+        frame_offset = chunk_offset + self.index_size + slot * self.frame_size
+        self.file.seek(frame_offset)
+        self.file.write(frame.data)
+
+        # the index entry is written last, marking the frame as complete
+        entry = np.array((sequence, timestamp, frame_offset, self.profile_ids[profile], 0), dtype=INDEX_DTYPE)
+        self.file.seek(chunk_offset + slot * INDEX_DTYPE.itemsize)
+        self.file.write(entry.tobytes())
+        self.num_frames += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class FrameRecordingReader:
+    """Reads a recording written by FrameRecorder
+
+    Frames are returned as np.memmap views into the file, nothing is copied.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            magic = file.read(len(RECORDING_MAGIC))
+            if magic not in (RECORDING_MAGIC, RECORDING_MAGIC_V1):
+                raise ValueError(f"{path} is not a frame recording")
+            header_length, = struct.unpack("<I", file.read(4))
+            header = json.loads(file.read(header_length))
+
+        self.dtype = np.dtype(header["dtype"])
+        self.frames_per_chunk = header["frames_per_chunk"]
+        if magic == RECORDING_MAGIC_V1:
+            header_profiles = [{"name": "default", "config": header["config"], "frame_shape": header["frame_shape"]}]
+            index_dtype = INDEX_DTYPE_V1
+            frame_size = int(np.prod(header["frame_shape"])) * self.dtype.itemsize
+        else:
+            header_profiles = header["profiles"]
+            index_dtype = INDEX_DTYPE
+            frame_size = header["frame_size"]
+
+        # profiles in the order of their ids in the index
+        self.profile_names = [profile["name"] for profile in header_profiles]
+        self.profiles = {profile["name"]: config_from_dict(profile["config"]) for profile in header_profiles}
+        self.frame_shapes = {profile["name"]: tuple(profile["frame_shape"]) for profile in header_profiles}
+        self._frame_shapes = [self.frame_shapes[name] for name in self.profile_names]
+        # config and frame shape of the first profile for single profile users
+        self.config = self.profiles[self.profile_names[0]]
+        self.frame_shape = self.frame_shapes[self.profile_names[0]]
+
+        self.chunk_dtype, _ = _chunk_layout(index_dtype, frame_size, self.frames_per_chunk)
+        data_offset = -(-(len(RECORDING_MAGIC) + 4 + header_length) // HEADER_ALIGN) * HEADER_ALIGN
+
+        num_chunks = (os.path.getsize(path) - data_offset) // self.chunk_dtype.itemsize
+        if num_chunks > 0:
+            self.chunks = np.memmap(path, dtype=self.chunk_dtype, mode="r", offset=data_offset, shape=(num_chunks,))
+            index = self.chunks["index"].reshape(-1)
+            # frames are appended in order, so the valid entries form a prefix
+            self.num_frames = int(np.count_nonzero(index["sequence"]))
+            self.index = np.zeros(self.num_frames, dtype=INDEX_DTYPE)
+            for field in index_dtype.names:
+                self.index[field] = index[field][:self.num_frames]
+        else:
+            self.chunks = None
+            self.num_frames = 0
+            self.index = np.zeros(0, dtype=INDEX_DTYPE)
+
+    def __len__(self):
+        return self.num_frames
+
+    def __getitem__(self, position):
+        return self.frame(position)
+
+    def frame(self, position):
+        """Frame at the given position (0 .. len-1) in the recording"""
+        if position < 0:
+            position += self.num_frames
+        if not 0 <= position < self.num_frames:
+            raise IndexError(f"Frame {position} out of range, recording has {self.num_frames} frames")
+        chunk, slot = divmod(position, self.frames_per_chunk)
+        shape = self._frame_shapes[self.index["profile"][position]]
+        num_bytes = int(np.prod(shape)) * self.dtype.itemsize
+        return self.chunks["frames"][chunk, slot, :num_bytes].view(self.dtype).reshape(shape)
+
+    def profile_of(self, position):
+        """Name of the profile the frame at the given position was acquired with"""
+        return self.profile_names[self.index["profile"][position]]
+
+    def positions_of_profile(self, profile):
+        """Positions of all frames of a profile, in recording order"""
+        return np.flatnonzero(self.index["profile"] == self.profile_names.index(profile))
+
+    def position_of_sequence(self, sequence):
+        """Position of the frame with the given sequence number"""
+        position = int(np.searchsorted(self.index["sequence"], sequence))
+        if position >= self.num_frames or self.index["sequence"][position] != sequence:
+            raise KeyError(f"Frame with sequence {sequence} not in recording")
+        return position
+
+    def position_at_time(self, timestamp):
+        """Position of the first frame acquired at or after timestamp"""
+        return int(np.searchsorted(self.index["timestamp"], timestamp))
+
+    def frames(self, start=0, stop=None, profile=None):
+        """Iterate over (sequence, timestamp, frame) from start to stop
+
+        If profile is given, only the frames of that profile are returned.
+        """
+        stop = self.num_frames if stop is None else min(stop, self.num_frames)
+        profile_id = None if profile is None else self.profile_names.index(profile)
+        for position in range(start, stop):
+            entry = self.index[position]
+            if profile_id is not None and entry["profile"] != profile_id:
+                continue
+            yield int(entry["sequence"]), float(entry["timestamp"]), self.frame(position)
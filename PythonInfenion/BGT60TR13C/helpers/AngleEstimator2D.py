@@ -0,0 +1,95 @@
+import numpy as np
+
+from helpers import constant_cache, precision
+
+
+class AngleEstimator2D:
+    """Azimuth and elevation of targets with the L-shaped array of the BGT60TR13C
+
+    The three RX antennas form an L: RX1 and RX3 are a horizontal pair, RX2
+    and RX3 a vertical pair, RX3 is the common corner. The antenna snapshots
+    of a target (e.g. one cell of a range-Doppler cube for all antennas) are
+    correlated with the steering vectors of a grid of azimuth and elevation
+    angles, the best matching grid point is the estimate. The steering table
+    is computed once, the evaluation runs on all detections at once.
+
+    The azimuth follows the convention of DigitalBeamForming: a target at a
+    positive azimuth reaches the corner antenna (RX3) with a phase ahead of
+    the outer antenna of the horizontal pair (RX1), i.e. the snapshot a beam
+    of DigitalBeamForming.run is steered to gives the same azimuth here. A
+    positive elevation means the outer antenna of the vertical pair (RX2) is
+    ahead of the corner antenna.
+    """
+
+    def __init__(self, num_azimuth: int = 27, num_elevation: int = 27, max_azimuth_degrees: float = 45,
+                 max_elevation_degrees: float = 45, d_by_lambda: float = 0.5, azimuth_antennas=(0, 2),
+                 elevation_antennas=(1, 2), dtype=None, chunk_size: int = 1024):
+        """Create the steering table
+
+        Parameters:
+            - num_azimuth:           number of azimuth angles of the grid
+            - num_elevation:         number of elevation angles of the grid
+            - max_azimuth_degrees:   azimuths range from -max .. +max
+            - max_elevation_degrees: elevations range from -max .. +max
+            - d_by_lambda:           separation of the antennas of a pair
+                                     divided by the wavelength
+            - azimuth_antennas:      indices (outer antenna, corner antenna)
+                                     of the horizontal pair in the frame
+            - elevation_antennas:    indices (outer antenna, corner antenna)
+                                     of the vertical pair in the frame
+            - dtype:                 complex data type, defaults to
+                                     helpers.precision.complex_dtype()
+            - chunk_size:            number of detections evaluated at once,
+                                     bounds the memory of the correlation
+        """
+        if azimuth_antennas[1] != elevation_antennas[1]:
+            raise ValueError("Azimuth and elevation pair must share the corner antenna")
+        self.num_antennas = max(max(azimuth_antennas), max(elevation_antennas)) + 1
+        self.chunk_size = chunk_size
+        dtype = precision.complex_dtype() if dtype is None else np.dtype(dtype)
+
+        self.azimuth_rad = np.radians(np.linspace(-max_azimuth_degrees, max_azimuth_degrees, num_azimuth))
+        self.elevation_rad = np.radians(np.linspace(-max_elevation_degrees, max_elevation_degrees, num_elevation))
+
+        key = ("steering_2d", self.num_antennas, dtype, num_azimuth, num_elevation, float(max_azimuth_degrees),
+               float(max_elevation_degrees), float(d_by_lambda), tuple(azimuth_antennas), tuple(elevation_antennas))
+
+        def compute():
+            # direction cosines of the grid (elevation x azimuth), u along the
+            # horizontal pair, v along the vertical pair
+            u = np.outer(np.cos(self.elevation_rad), np.sin(self.azimuth_rad)).ravel()
+            v = np.repeat(np.sin(self.elevation_rad), num_azimuth)
+
+            # antenna positions in wavelengths relative to the corner, the
+            # outer antenna of the horizontal pair is on the negative side as
+            # antenna 0 of DigitalBeamForming
+            position_u = np.zeros((self.num_antennas, 1))
+            position_v = np.zeros((self.num_antennas, 1))
+            position_u[azimuth_antennas[0]] = -d_by_lambda
+            position_v[elevation_antennas[0]] = d_by_lambda
+
+            # conjugated steering vectors (num_antennas x grid points), the
+            # correlation of snapshots x is x @ weights
+            steering = np.exp(1j * 2 * np.pi * (position_u * u + position_v * v))
+            return np.conj(steering).astype(dtype)
+
+        self.weights = constant_cache.cached(key, compute)
+
+    def estimate(self, snapshots):
+        """Azimuth and elevation of every snapshot
+
+        Parameters:
+            - snapshots: complex values of all antennas (num_detections x
+                         num_antennas), e.g. range_doppler[r, d] of a cube
+                         (range x Doppler x antennas) for the detected cells
+
+        Returns:
+            - azimuth and elevation in rad (num_detections each)
+        """
+        snapshots = np.asarray(snapshots)[:, :self.num_antennas]
+        best = np.empty(len(snapshots), dtype=np.intp)
+        for start in range(0, len(snapshots), self.chunk_size):
+            correlation = snapshots[start:start + self.chunk_size] @ self.weights
+            best[start:start + self.chunk_size] = np.argmax(correlation.real ** 2 + correlation.imag ** 2, axis=1)
+        elevation_index, azimuth_index = np.divmod(best, len(self.azimuth_rad))
+        return self.azimuth_rad[azimuth_index], self.elevation_rad[elevation_index]
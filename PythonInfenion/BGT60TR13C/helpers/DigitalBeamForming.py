@@ -28,9 +28,13 @@
 
 import numpy as np
 
+from helpers import precision
+from helpers.constant_cache import steering_weights
+
 
 class DigitalBeamForming:
-    def __init__(self, num_antennas: int, num_beams: int = 27, max_angle_degrees: float = 45, d_by_lambda: float = 0.5):
+    def __init__(self, num_antennas: int, num_beams: int = 27, max_angle_degrees: float = 45, d_by_lambda: float = 0.5,
+                 dtype=None):
         """Create a Digital Beam Forming object
 
         Parameters:
@@ -39,46 +43,121 @@ class DigitalBeamForming:
             - max_angle_degrees:    maximum angle in degrees, angles will range
                                     from -max_angle_degrees .. +max_angle_degrees
             - d_by_lambda:          separation of RX antennas divided by the wavelength
+            - dtype:                complex data type of the beams, np.complex64
+                                    halves memory traffic at reduced precision.
+                                    Defaults to helpers.precision.complex_dtype()
         """
-        angle_vector = np.radians(np.linspace(-max_angle_degrees, max_angle_degrees, num_beams))
-
-        weights = np.zeros((num_antennas, num_beams), dtype=complex)
-
-        for iBeam in range(num_beams):
-            angle = angle_vector[iBeam]
-            for iAntenna in range(num_antennas):
-                weights[iAntenna, iBeam] = np.exp(
-                    1j * 2 * np.pi * iAntenna * d_by_lambda * np.sin(angle))  # /sqrt(num_antennas)
+        self.dtype = precision.complex_dtype() if dtype is None else np.dtype(dtype)
+        # the weights only depend on the geometry, all objects share one
+        # read-only copy from helpers.constant_cache
+        self.weights = steering_weights(num_antennas, num_beams, max_angle_degrees, d_by_lambda, self.dtype)
 
-        self.weights = weights
+        # run sums antenna i with the weight of antenna num_antennas - i - 1
+        self.antenna_weights = np.ascontiguousarray(self.weights[::-1])
 
-    def run(self, range_doppler):
+    def run(self, range_doppler, range_bins=None, out=None):
         """Compute virtual beams
 
         Parameters:
             - range_doppler: Range Doppler spectrum for all RX antennas
               (dimension: num_samples_per_chirp x num_chirps_per_frame x
               num_antennas)
+            - range_bins:    optional index or slice of range bins, beams are
+              only computed for these bins
+            - out:           optional array the beams are written to
         
         Returns:
             - Range Doppler Beams (dimension: num_samples_per_chirp x
-              num_chirps_per_frame x num_beams)
+              num_chirps_per_frame x num_beams, only the selected range bins
+              if range_bins is given)
         """
-
-        num_samples, num_chirps, num_antennas = range_doppler.shape
+        num_antennas = range_doppler.shape[-1]
 
         num_antennas_internal, num_beams = self.weights.shape
 
         assert num_antennas == num_antennas_internal
 
-        rd_beam_formed = np.zeros((num_samples, num_chirps, num_beams), dtype=complex);
+        if range_bins is not None:
+            range_doppler = range_doppler[range_bins]
+
+        if range_doppler.dtype != self.dtype:
+            range_doppler = range_doppler.astype(self.dtype)
+
+        # sum over the antenna axis for all beams at once
+        return np.matmul(range_doppler, self.antenna_weights, out=out)
 
-        for iBeam in range(num_beams):
-            acc = np.zeros((num_samples, num_chirps), dtype=complex)
+    def beam_energy(self, range_doppler, beams=None, covariance=None):
+        """Energy of beams per range bin
 
-            for iAntenna in range(num_antennas):
-                acc += range_doppler[:, :, iAntenna] * self.weights[num_antennas - iAntenna - 1, iBeam]
+        The energy over all Doppler bins of a beam is w^H C w with the
+        spatial covariance C of the antennas (num_antennas x num_antennas per
+        range bin), so beams are evaluated without forming them for every
+        Doppler bin.
 
-            rd_beam_formed[:, :, iBeam] = acc
+        Parameters:
+            - range_doppler: Range Doppler spectrum for all RX antennas
+              (dimension: range bins x Doppler bins x num_antennas)
+            - beams:         optional indices of the evaluated beams, all
+              beams by default
+            - covariance:    optional covariance from spatial_covariance
+
+        Returns:
+            - norm over the Doppler bins of every beam divided by
+              sqrt(num_beams) (dimension: range bins x number of beams), as
+              np.linalg.norm(run(range_doppler), axis=1) / sqrt(num_beams)
+        """
+        if covariance is None:
+            covariance = self.spatial_covariance(range_doppler)
+        weights = self.antenna_weights if beams is None else self.antenna_weights[:, beams]
+        power = np.einsum('ab,rac,cb->rb', weights, covariance, weights.conj()).real
+        return np.sqrt(np.maximum(power, 0) / self.weights.shape[1])
 
-        return rd_beam_formed
+    def spatial_covariance(self, range_doppler):
+        """Covariance of the antennas per range bin, summed over the Doppler bins
+
+        Returns:
+            - C (dimension: range bins x num_antennas x num_antennas),
+              C[r, a, c] = sum over d of x[r, d, a] * conj(x[r, d, c])
+        """
+        range_doppler = np.asarray(range_doppler)
+        return np.matmul(range_doppler.transpose(0, 2, 1), range_doppler.conj())
+
+    def strongest_beam(self, range_doppler, coarse_step: int = 4, num_candidates: int = 3):
+        """Range bin and beam with the highest energy, coarse-to-fine search
+
+        Every coarse_step-th beam is evaluated on all range bins first, then
+        all beams within coarse_step of the num_candidates strongest coarse
+        range bin / beam pairs. The result is that of the dense scan
+        (argmax of beam_energy) as long as the beam pattern has no second
+        maximum between two coarse beams, which holds for the broad beams of
+        a small array.
+
+        Parameters:
+            - range_doppler:  Range Doppler spectrum for all RX antennas
+              (dimension: range bins x Doppler bins x num_antennas)
+            - coarse_step:    distance of the coarse beams
+            - num_candidates: number of coarse maxima that are refined
+
+        Returns:
+            - range bin, beam index and energy (scaled as beam_energy)
+        """
+        num_beams = self.weights.shape[1]
+        covariance = self.spatial_covariance(range_doppler)
+
+        coarse = np.unique(np.append(np.arange(0, num_beams, coarse_step), num_beams - 1))
+        coarse_energy = self.beam_energy(None, coarse, covariance)
+        num_candidates = min(num_candidates, coarse_energy.size)
+        candidates = np.argpartition(coarse_energy.ravel(), -num_candidates)[-num_candidates:]
+        candidate_range, candidate_beam = np.unravel_index(candidates, coarse_energy.shape)
+
+        # all beams around the candidates, evaluated on the candidate range bins
+        offsets = np.arange(-coarse_step, coarse_step + 1)
+        fine = np.clip(coarse[candidate_beam][:, np.newaxis] + offsets, 0, num_beams - 1)
+        fine_energy = self.beam_energy(None, fine.ravel(), covariance[candidate_range]).reshape(
+            num_candidates, num_candidates, -1)
+        # energy of the beams of candidate i on its own range bin
+        fine_energy = fine_energy[np.arange(num_candidates), np.arange(num_candidates)]
+
+        best_candidate, best_offset = np.unravel_index(np.argmax(fine_energy), fine_energy.shape)
+        return (int(candidate_range[best_candidate]), int(fine[best_candidate, best_offset]),
+                fine_energy[best_candidate, best_offset])
@@ -27,31 +27,48 @@
 # ===========================================================================
 
 import numpy as np
-from scipy import signal, constants
+from scipy import constants
 
-from ifxradarsdk.fmcw.types import FmcwSequenceChirp
+from helpers import constant_cache, precision
 from helpers.fft_spectrum import *
+from helpers.peak_interpolation import PeakInterpolator
 
 
 class DistanceAlgo:
     """Algorithm for computation of distance FFT from raw data"""
 
-    def __init__(self, chirp: FmcwSequenceChirp, num_chirps_per_frame: int):
+    def __init__(self, chirp, num_chirps_per_frame: int, zero_pad: int = 2,
+                 interpolation: str = None):
+        # chirp:         FmcwSequenceChirp of the configuration, no SDK import
+        #                is needed as only its fields are read
+        # zero_pad:      FFT size as multiple of num_samples, 1 disables
+        #                zero padding
+        # interpolation: None for the distance of the peak bin, or a method
+        #                of helpers.peak_interpolation ("parabolic",
+        #                "gaussian", "phase") for a sub-bin distance
         self.num_chirps_per_frame = num_chirps_per_frame
+        self.zero_pad = zero_pad
 
         # compute Blackman-Harris Window matrix over chirp samples(range)
-        self.range_window = signal.windows.blackmanharris(chirp.num_samples).reshape(1, chirp.num_samples)
+        self.range_window = constant_cache.window("blackmanharris", chirp.num_samples).reshape(1, chirp.num_samples)
+
+        # output buffer of the range FFT, reused for every frame
+        fft_size = chirp.num_samples * zero_pad
+        self.range_fft = np.empty((num_chirps_per_frame, fft_size // 2), dtype=precision.complex_dtype())
 
         bandwidth_hz = abs(chirp.end_frequency_Hz - chirp.start_frequency_Hz)
-        fft_size = chirp.num_samples * 2
         self.range_bin_length = constants.c / (2 * bandwidth_hz * fft_size / chirp.num_samples)
 
+        self.interpolator = None
+        if interpolation is not None:
+            self.interpolator = PeakInterpolator(self.range_window, zero_pad, interpolation)
+
     def compute_distance(self, chirp_data):
         # Computes distance using chirp data
         # chirp_data: single antenna chirp data
 
         # Step 1 - calculate range fft spectrum of the frame
-        range_fft = fft_spectrum(chirp_data, self.range_window)
+        range_fft = fft_spectrum(chirp_data, self.range_window, self.range_fft, self.zero_pad)
 
         # Step 2 - convert to absolute spectrum
         range_fft_abs = abs(range_fft)
@@ -60,8 +77,16 @@ class DistanceAlgo:
         distance_data = np.divide(range_fft_abs.sum(axis=0), self.num_chirps_per_frame)
 
         # Step 4 - peak search and distance calculation
-        skip = 8
-        distance_peak = np.argmax(distance_data[skip:])
+        skip = 4 * self.zero_pad
+        distance_peak = np.argmax(distance_data[skip:]) + skip
+
+        # Step 5 - optional sub-bin interpolation of the peak
+        if self.interpolator is not None:
+            if self.interpolator.method == "phase":
+                # average the estimates of all chirps
+                distance_peak = distance_peak + np.mean(self.interpolator.offset(range_fft, distance_peak))
+            else:
+                distance_peak = self.interpolator.refine(distance_data, distance_peak)
 
-        distance_peak_m = self.range_bin_length * (distance_peak + skip)
+        distance_peak_m = self.range_bin_length * distance_peak
         return distance_peak_m, distance_data
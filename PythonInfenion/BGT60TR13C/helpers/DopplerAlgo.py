@@ -27,15 +27,16 @@
 # ===========================================================================
 
 import numpy as np
-from scipy import signal
 
+from helpers import constant_cache, fft_backend, precision
 from helpers.fft_spectrum import *
 
 
 class DopplerAlgo:
     """Compute Range-Doppler map"""
 
-    def __init__(self, num_samples: int, num_chirps_per_frame: int, num_ant: int, mti_alpha: float = 0.8):
+    def __init__(self, num_samples: int, num_chirps_per_frame: int, num_ant: int, mti_alpha: float = 0.8,
+                 doppler_zero_pad: int = 2, range_gate: slice = None):
         """Create Range-Doppler map object
 
         Parameters:
@@ -43,20 +44,45 @@ class DopplerAlgo:
             - num_chirps_per_frame: Number of chirp repetitions within a measurement frame
             - num_ant:              Number of antennas
             - mti_alpha:            Parameter alpha of Moving Target Indicator
+            - doppler_zero_pad:     Doppler FFT size as multiple of num_chirps_per_frame,
+                                    1 disables zero padding
+            - range_gate:           Range bins (slice) of the range FFT for which the
+                                    Doppler spectrum is computed, see range_gate_bins.
+                                    None computes all num_samples bins
         """
+        self.num_samples = num_samples
         self.num_chirps_per_frame = num_chirps_per_frame
+        self.num_ant = num_ant
+        self.doppler_fft_size = doppler_zero_pad * num_chirps_per_frame
+
+        # original bin numbers of the range bins of the Range-Doppler maps
+        self.range_gate = slice(None) if range_gate is None else range_gate
+        self.range_bins = np.arange(num_samples)[self.range_gate]
+        num_range_bins = len(self.range_bins)
+
+        # data types of all buffers, see helpers.precision
+        self.float_dtype = precision.float_dtype()
+        self.complex_dtype = precision.complex_dtype()
 
         # compute Blackman-Harris Window matrix over chirp samples(range)
-        self.range_window = signal.windows.blackmanharris(num_samples).reshape(1, num_samples)
+        self.range_window = constant_cache.window("blackmanharris", num_samples, self.float_dtype).reshape(1, num_samples)
 
         # compute Blackman-Harris Window matrix over number of chirps(velocity)
-        self.doppler_window = signal.windows.blackmanharris(self.num_chirps_per_frame).reshape(1, self.num_chirps_per_frame)
+        self.doppler_window = constant_cache.window("blackmanharris", self.num_chirps_per_frame,
+                                                    self.float_dtype).reshape(1, self.num_chirps_per_frame)
 
         # parameter for moving target indicator (MTI)
         self.mti_alpha = mti_alpha
 
         # initialize MTI filter
-        self.mti_history = np.zeros((self.num_chirps_per_frame, num_samples, num_ant))
+        self.mti_history = np.zeros((num_ant, self.num_chirps_per_frame, num_samples), dtype=self.float_dtype)
+
+        # work buffers of compute_doppler_cube, reused for every frame
+        self.data = np.empty((num_ant, self.num_chirps_per_frame, num_samples), dtype=self.float_dtype)
+        self.data_mti = np.empty((num_ant, self.num_chirps_per_frame, num_samples), dtype=self.float_dtype)
+        self.range_fft = np.empty((num_ant, self.num_chirps_per_frame, num_samples), dtype=self.complex_dtype)
+        self.range_fft_windowed = np.empty((num_ant, num_range_bins, self.num_chirps_per_frame), dtype=self.complex_dtype)
+        self.doppler_cube = np.empty((num_ant, num_range_bins, self.doppler_fft_size), dtype=self.complex_dtype)
 
     def compute_doppler_map(self, data: np.ndarray, i_ant: int):
         """Compute Range-Doppler map for i-th antennas
@@ -65,13 +91,17 @@ class DopplerAlgo:
             - data:     Raw-data for one antenna (dimension:
                         num_chirps_per_frame x num_samples)
             - i_ant:    RX antenna index
+
+        Returns:
+            - Range-Doppler map (dimension: range bins x doppler_fft_size),
+              the range bins are the bins of range_bins
         """
         # Step 1 - Remove average from signal (mean removal)
-        data = data - np.average(data)
+        data = np.subtract(data, np.average(data), dtype=self.float_dtype)
  
         # Step 2 - MTI processing to remove static objects
-        data_mti = data - self.mti_history[:, :, i_ant]
-        self.mti_history[:, :, i_ant] = data * self.mti_alpha + self.mti_history[:, :, i_ant] * (1 - self.mti_alpha)
+        data_mti = data - self.mti_history[i_ant]
+        self.mti_history[i_ant] = data * self.mti_alpha + self.mti_history[i_ant] * (1 - self.mti_alpha)
 
         # Step 3 - calculate fft spectrum for the frame
         fft1d = fft_spectrum(data_mti, self.range_window)
@@ -80,13 +110,54 @@ class DopplerAlgo:
 
         # Transpose
         # Distance is now indicated on y axis
-        fft1d = np.transpose(fft1d)
+        fft1d = np.transpose(fft1d)[self.range_gate]
 
         # Step 4 - Windowing the Data in doppler
         fft1d = np.multiply(fft1d, self.doppler_window)
 
-        zp2 = np.pad(fft1d, ((0, 0), (0, self.num_chirps_per_frame)), "constant")
-        fft2d = np.fft.fft(zp2) / self.num_chirps_per_frame
+        fft2d = fft_backend.fft(fft1d, n=self.doppler_fft_size) / self.num_chirps_per_frame
+
+        # re-arrange fft result for zero speed at centre
+        return fft_backend.fftshift(fft2d, (1,))
+
+    def compute_doppler_cube(self, frame: np.ndarray):
+        """Compute Range-Doppler maps of all antennas at once
+
+        Parameter:
+            - frame:    Raw-data of all antennas (dimension:
+                        num_ant x num_chirps_per_frame x num_samples)
+
+        Returns:
+            - Range-Doppler cube (dimension: range bins x doppler_fft_size x
+              num_ant), the same layout DigitalBeamForming.run expects. Range
+              bin i is bin range_bins[i] of the range FFT. The array is a view
+              of a work buffer overwritten by the next call.
+        """
+        # Step 1 - Remove average from signal (mean removal), per antenna
+        data = self.data
+        np.subtract(frame, np.mean(frame, axis=(1, 2), keepdims=True), out=data)
+
+        # Step 2 - MTI processing to remove static objects
+        np.subtract(data, self.mti_history, out=self.data_mti)
+        self.mti_history *= 1 - self.mti_alpha
+        data *= self.mti_alpha
+        self.mti_history += data
+
+        # Step 3 - calculate fft spectrum for the frame
+        fft1d = fft_spectrum_frame(self.data_mti, self.range_window, self.range_fft)
+
+        # Step 4 - Transpose, distance is now indicated on y axis, and
+        # window the data in doppler. Only the gated range bins are kept.
+        np.multiply(fft1d.transpose(0, 2, 1)[:, self.range_gate], self.doppler_window, out=self.range_fft_windowed)
+
+        # Step 5 - Doppler FFT over the chirps, n= zero pads
+        fft2d = fft_backend.fft(self.range_fft_windowed, n=self.doppler_fft_size)
 
         # re-arrange fft result for zero speed at centre
-        return np.fft.fftshift(fft2d, (1,))
+        n = self.doppler_fft_size
+        half = n // 2
+        out = self.doppler_cube
+        scale = 1 / self.num_chirps_per_frame
+        np.multiply(fft2d[:, :, n - half:], scale, out=out[:, :, :half])
+        np.multiply(fft2d[:, :, :n - half], scale, out=out[:, :, half:])
+        return out.transpose(1, 2, 0)
@@ -0,0 +1,102 @@
+import numpy as np
+
+from helpers import precision
+
+
+class MicroDopplerSpectrogram:
+    """Streaming velocity-time spectrogram
+
+    Keeps the Doppler profiles of the last frames in a circular buffer that
+    is written twice, at row i and at row i + history. The last n profiles
+    are then always one contiguous block of the buffer, so windows are
+    returned as views without copying, and adding a frame only writes one
+    profile.
+    """
+
+    def __init__(self, num_doppler_bins: int, history: int = 64, velocity_axis=None, range_gate: slice = None,
+                 dtype=None):
+        """Create an empty spectrogram
+
+        Parameters:
+            - num_doppler_bins: Number of Doppler bins of a profile
+            - history:          Number of frames kept
+            - velocity_axis:    Velocity of every Doppler bin, e.g.
+                                SensorGeometry.velocity_axis_m_s, needed for
+                                the velocity features
+            - range_gate:       Range bins (slice) summed by update, None for all
+            - dtype:            Defaults to helpers.precision.float_dtype()
+        """
+        self.num_doppler_bins = num_doppler_bins
+        self.history = history
+        self.velocity_axis = None if velocity_axis is None else np.asarray(velocity_axis)
+        self.range_gate = slice(None) if range_gate is None else range_gate
+        self.dtype = precision.float_dtype() if dtype is None else np.dtype(dtype)
+
+        self.buffer = np.zeros((2 * history, num_doppler_bins), dtype=self.dtype)
+        # row the next profile is written to
+        self.index = 0
+        self.num_frames = 0
+
+    def push(self, profile):
+        """Append a Doppler profile (num_doppler_bins), e.g. power per Doppler bin"""
+        row = self.buffer[self.index]
+        row[...] = profile
+        self.buffer[self.index + self.history] = row
+        self.index = (self.index + 1) % self.history
+        self.num_frames += 1
+
+    def update(self, range_doppler):
+        """Append the Doppler profile of a range-Doppler map
+
+        Parameters:
+            - range_doppler: complex range-Doppler map (range bins x Doppler
+                             bins) or cube (range bins x Doppler bins x
+                             antennas), e.g. DopplerAlgo.compute_doppler_cube
+
+        The power of the gated range bins and all antennas is summed per
+        Doppler bin.
+        """
+        gated = range_doppler[self.range_gate]
+        power = gated.real ** 2 + gated.imag ** 2
+        axes = (0,) + tuple(range(2, power.ndim))
+        row = self.buffer[self.index]
+        np.sum(power, axis=axes, out=row)
+        self.buffer[self.index + self.history] = row
+        self.index = (self.index + 1) % self.history
+        self.num_frames += 1
+
+    def window(self, length: int = None):
+        """Last length profiles, oldest first (length x num_doppler_bins)
+
+        The result is a read-only view of the buffer, it changes when frames
+        are added. Frames before the first one are zero.
+        """
+        length = self.history if length is None else length
+        if not 0 < length <= self.history:
+            raise ValueError(f"Window length must be 1 .. {self.history}, got {length}")
+        end = self.index + self.history
+        view = self.buffer[end - length:end]
+        view.flags.writeable = False
+        return view
+
+    def latest(self):
+        """Profile of the last frame"""
+        return self.window(1)[0]
+
+    def mean_velocity(self, length: int = None):
+        """Power weighted mean velocity of every frame of the window"""
+        window = self._velocity_window(length)
+        total = window.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            velocity = window @ self.velocity_axis / total
+        return np.where(total > 0, velocity, 0.0)
+
+    def peak_velocity(self, length: int = None):
+        """Velocity of the strongest Doppler bin of every frame of the window"""
+        window = self._velocity_window(length)
+        return self.velocity_axis[np.argmax(window, axis=1)]
+
+    def _velocity_window(self, length):
+        if self.velocity_axis is None:
+            raise ValueError("Velocity features need the velocity_axis of the Doppler bins")
+        return self.window(length)
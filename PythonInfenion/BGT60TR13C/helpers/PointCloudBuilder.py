@@ -0,0 +1,104 @@
+import numpy as np
+
+from helpers.AngleEstimator2D import AngleEstimator2D
+from helpers.SensorGeometry import SensorGeometry
+
+# fields of a point cloud: range (m), Doppler frequency (Hz), radial velocity
+# (m/s), azimuth angle (rad), elevation (rad, 0 if not measured), cartesian
+# coordinates (m, x along the boresight, z up) and SNR (linear)
+POINT_DTYPE = np.dtype([("range", np.float64), ("doppler", np.float64), ("velocity", np.float64),
+                        ("angle", np.float64), ("elevation", np.float64), ("x", np.float64), ("y", np.float64),
+                        ("z", np.float64), ("snr", np.float64)])
+
+
+class PointCloudBuilder:
+    """Conversion of CFAR detections of a beamformed range-Doppler cube to points
+
+    All metric quantities are looked up in tables computed once from the
+    geometry, a frame is converted in one vectorized pass over the
+    detections.
+    """
+
+    def __init__(self, geometry: SensorGeometry, axis_names=("range", "doppler", "beam"),
+                 angle_estimator: AngleEstimator2D = None):
+        """Create the lookup tables
+
+        Parameters:
+            - geometry:        SensorGeometry of the configuration, its axes
+                               have to match the bins of the cube the
+                               detections come from
+            - axis_names:      names of the range, Doppler and beam index
+                               fields of the detections (see helpers.cfar)
+            - angle_estimator: optional AngleEstimator2D, azimuth and
+                               elevation of the points are then estimated
+                               from the antenna values instead of taken
+                               from the beam. A (range, Doppler) cell
+                               detected in several beams then gives a single
+                               point, the detection of its strongest beam
+        """
+        self.geometry = geometry
+        self.axis_names = axis_names
+        self.angle_estimator = angle_estimator
+
+        self.range_m = geometry.range_axis_m
+        self.doppler_Hz = geometry.doppler_axis_Hz
+        self.velocity_m_s = geometry.velocity_axis_m_s
+        self.angle_rad = geometry.angle_axis_rad
+
+        # cartesian position of every range bin and beam (range bins x beams)
+        self.x = np.outer(self.range_m, np.cos(self.angle_rad))
+        self.y = np.outer(self.range_m, np.sin(self.angle_rad))
+
+    def build(self, detections, range_doppler=None):
+        """Point cloud of the detections
+
+        Parameters:
+            - detections:    structured array of helpers.cfar with the index
+                             fields named by axis_names and the field "snr"
+            - range_doppler: range-Doppler cube of all antennas (range bins x
+                             Doppler bins x antennas) the detections were
+                             found in, needed with an angle_estimator
+
+        Returns:
+            - structured array of POINT_DTYPE, one point per detection, or
+              per detected (range, Doppler) cell with an angle_estimator
+        """
+        if self.angle_estimator is not None:
+            # the angle only depends on the cell, further beams of a cell
+            # would give identical points
+            detections = self._strongest_beam_per_cell(detections)
+
+        r = detections[self.axis_names[0]]
+        d = detections[self.axis_names[1]]
+        b = detections[self.axis_names[2]]
+
+        points = np.empty(len(detections), dtype=POINT_DTYPE)
+        points["range"] = self.range_m[r]
+        points["doppler"] = self.doppler_Hz[d]
+        points["velocity"] = self.velocity_m_s[d]
+        if self.angle_estimator is None:
+            points["angle"] = self.angle_rad[b]
+            points["elevation"] = 0
+            points["x"] = self.x[r, b]
+            points["y"] = self.y[r, b]
+            points["z"] = 0
+        else:
+            azimuth, elevation = self.angle_estimator.estimate(range_doppler[r, d])
+            ground_range = points["range"] * np.cos(elevation)
+            points["angle"] = azimuth
+            points["elevation"] = elevation
+            points["x"] = ground_range * np.cos(azimuth)
+            points["y"] = ground_range * np.sin(azimuth)
+            points["z"] = points["range"] * np.sin(elevation)
+        points["snr"] = detections["snr"]
+        return points
+
+    def _strongest_beam_per_cell(self, detections):
+        # Detection with the highest SNR of every (range, Doppler) cell
+        r = detections[self.axis_names[0]]
+        d = detections[self.axis_names[1]]
+        order = np.lexsort((-detections["snr"], d, r))
+        r, d = r[order], d[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (r[1:] != r[:-1]) | (d[1:] != d[:-1])
+        return detections[order[first]]
@@ -0,0 +1,122 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from helpers import constant_cache
+from helpers.DigitalBeamForming import DigitalBeamForming
+from helpers.DopplerAlgo import DopplerAlgo
+from helpers.fft_spectrum import window_frame, range_spectrum
+
+
+class ProcessingGraph:
+    """Processing shared by all usecases reading frames of one acquisition profile
+
+    Every frame gets a FrameProducts object. Its intermediate results are
+    computed on first use and then shared by all usecases that process the
+    same frame, so adding a usecase only adds the work of the products it
+    needs and nobody else computed yet.
+    """
+
+    def __init__(self, num_samples: int, num_chirps_per_frame: int, num_ant: int, mti_alpha: float = 0.8,
+                 num_beams: int = 27, max_angle_degrees: float = 45, range_gate: slice = None, history: int = 4):
+        """Create a processing graph
+
+        Parameters:
+            - num_samples:          Number of samples per chirp
+            - num_chirps_per_frame: Number of chirp repetitions within a measurement frame
+            - num_ant:              Number of antennas
+            - mti_alpha:            Parameter alpha of Moving Target Indicator
+            - num_beams:            Number of beams of the beamformed cube
+            - max_angle_degrees:    Beams range from -max_angle_degrees .. +max_angle_degrees
+            - range_gate:           Range bins (slice) the Doppler, beamforming and
+                                    range-angle products are computed for, None for all
+            - history:              Number of frames whose products are kept
+        """
+        self.num_samples = num_samples
+        self.num_chirps_per_frame = num_chirps_per_frame
+        self.num_ant = num_ant
+        self.num_beams = num_beams
+        self.max_angle_degrees = max_angle_degrees
+        self.history = history
+
+        self.range_window = constant_cache.window("blackmanharris", num_samples).reshape(1, num_samples)
+        self.doppler = DopplerAlgo(num_samples, num_chirps_per_frame, num_ant, mti_alpha, range_gate=range_gate)
+        # original bin numbers of the range bins of the gated products
+        self.range_bins = self.doppler.range_bins
+        self.dbf = DigitalBeamForming(num_ant, num_beams=num_beams, max_angle_degrees=max_angle_degrees)
+
+        # products are computed while holding the lock, so a product asked for
+        # by several threads is computed only once and the stateful MTI filter
+        # of the Doppler processing sees one frame at a time
+        self.lock = threading.RLock()
+        self.frames = OrderedDict()
+
+    def products(self, record):
+        """Products of a frame
+
+        Parameters:
+            - record: FrameRecord from radar_data_acquisition
+
+        Returns:
+            - FrameProducts shared by all callers passing a record with the
+              same sequence number
+        """
+        with self.lock:
+            products = self.frames.get(record.sequence)
+            if products is None:
+                products = FrameProducts(self, record)
+                self.frames[record.sequence] = products
+                while len(self.frames) > self.history:
+                    self.frames.popitem(last=False)
+            return products
+
+
+class FrameProducts:
+    """Lazily computed intermediate results of one frame
+
+    All returned arrays are read-only, they are shared by every usecase
+    processing the frame.
+    """
+
+    def __init__(self, graph: ProcessingGraph, record):
+        self.graph = graph
+        self.sequence = record.sequence
+        self.timestamp = record.timestamp
+        self.frame = record.data
+        self.cache = {}
+
+    def _get(self, name, compute):
+        with self.graph.lock:
+            value = self.cache.get(name)
+            if value is None:
+                value = compute()
+                value.flags.writeable = False
+                self.cache[name] = value
+            return value
+
+    def windowed_cube(self):
+        """DC removed and range windowed frame (num_ant x num_chirps x num_samples)"""
+        return self._get("windowed_cube", lambda: window_frame(self.frame, self.graph.range_window))
+
+    def range_fft(self):
+        """Range FFT of all chirps (num_ant x num_chirps x num_samples)"""
+        return self._get("range_fft", lambda: range_spectrum(self.windowed_cube()))
+
+    def range_profile(self):
+        """Magnitude of the range FFT averaged over the chirps (num_ant x num_samples)"""
+        return self._get("range_profile", lambda: np.abs(self.range_fft()).mean(axis=1))
+
+    def range_doppler(self):
+        """Range-Doppler cube after MTI (gated range bins x doppler bins x num_ant)"""
+        # compute_doppler_cube returns a work buffer reused for the next frame
+        return self._get("range_doppler", lambda: self.graph.doppler.compute_doppler_cube(self.frame).copy())
+
+    def beamformed(self):
+        """Beamformed range-Doppler cube (gated range bins x doppler bins x num_beams)"""
+        return self._get("beamformed", lambda: self.graph.dbf.run(self.range_doppler()))
+
+    def range_angle_energy(self):
+        """Energy per range bin and beam (gated range bins x num_beams)"""
+        return self._get("range_angle_energy",
+                         lambda: np.linalg.norm(self.beamformed(), axis=1) / np.sqrt(self.graph.num_beams))
@@ -0,0 +1,73 @@
+import numpy as np
+from scipy import signal
+
+
+class RangeZoom:
+    """High resolution range spectrum around coarse peaks (zoom FFT)
+
+    The spectrum is evaluated with a chirp-Z transform only in a narrow band
+    around each coarse peak. For a zoom factor of 16 this costs a transform
+    of about num_samples + span * zoom points per chirp instead of a range
+    FFT zero padded 16 times.
+    """
+
+    def __init__(self, num_samples: int, zoom: int = 16, span_bins: float = 2, zero_pad: int = 2):
+        """Create the zoom transform
+
+        Parameters:
+            - num_samples: Number of samples per chirp
+            - zoom:        Number of zoomed points per bin of the coarse spectrum
+            - span_bins:   Width of the zoomed band in bins of the coarse
+                           spectrum, centred on the peak
+            - zero_pad:    Zero padding of the coarse range FFT (see
+                           fft_spectrum), peaks are given in its bins
+        """
+        self.num_samples = num_samples
+        self.zoom = zoom
+        self.span_bins = span_bins
+        self.zero_pad = zero_pad
+
+        self.num_points = int(round(span_bins * zoom)) + 1
+        # zoomed points relative to the peak, in coarse bins
+        self.offsets = np.linspace(-span_bins / 2, span_bins / 2, self.num_points)
+
+        coarse_bin_hz = 1 / (zero_pad * num_samples)  # in cycles per sample
+        self.step = coarse_bin_hz / zoom
+        self.czt = signal.CZT(num_samples, self.num_points, w=np.exp(-2j * np.pi * self.step), a=1)
+        self.sample_index = np.arange(num_samples)
+
+    def spectrum(self, windowed: np.ndarray, peaks):
+        """Zoomed spectra around peaks
+
+        Parameters:
+            - windowed: DC removed and range windowed chirps (..., num_samples),
+                        e.g. from fft_spectrum.window_frame, any leading
+                        dimensions (antennas, chirps)
+            - peaks:    coarse peak positions in bins of the coarse spectrum
+
+        Returns:
+            - complex spectrum (..., num_peaks x num_points), scaled like
+              fft_spectrum; point i of peak p is at bin peaks[p] + offsets[i]
+        """
+        peaks = np.atleast_1d(np.asarray(peaks, dtype=float))
+        start = (peaks + self.offsets[0]) / (self.zero_pad * self.num_samples)
+
+        # shift the start of every band to frequency 0, then one chirp-Z
+        # transform covers all peaks, chirps and antennas
+        shift = np.exp(-2j * np.pi * np.outer(start, self.sample_index))
+        shifted = windowed[..., np.newaxis, :] * shift
+        return self.czt(shifted, axis=-1) * (2 / self.num_samples)
+
+    def refine(self, windowed: np.ndarray, peaks):
+        """Refined peak positions
+
+        The magnitude of the zoomed spectra is averaged over all leading
+        dimensions (antennas, chirps) before the maximum is searched.
+
+        Returns:
+            - peak positions in (fractional) bins of the coarse spectrum
+        """
+        peaks = np.atleast_1d(np.asarray(peaks, dtype=float))
+        magnitude = np.abs(self.spectrum(windowed, peaks))
+        magnitude = magnitude.reshape(-1, len(peaks), self.num_points).mean(axis=0)
+        return peaks + self.offsets[np.argmax(magnitude, axis=-1)]
@@ -0,0 +1,83 @@
+import numpy as np
+from scipy import constants
+
+from helpers import constant_cache
+from helpers.fft_spectrum import range_gate_bins
+
+
+class SensorGeometry:
+    """Quantities derived from a sequence configuration
+
+    Computed once from an FmcwSimpleSequenceConfig (or any object with the
+    same attributes) in plain Python, without the radar SDK. The metrics
+    match DeviceFmcw.metrics_from_sequence. The object is immutable and all
+    axes are read-only arrays, so one geometry can be shared by every
+    algorithm processing frames of the configuration.
+    """
+
+    def __init__(self, config, range_zero_pad: int = 2, doppler_zero_pad: int = 2, num_beams: int = 27,
+                 max_angle_degrees: float = 45, d_by_lambda: float = 0.5):
+        """Derive the geometry of a configuration
+
+        Parameters:
+            - config:            FmcwSimpleSequenceConfig
+            - range_zero_pad:    range FFT size as multiple of num_samples (see fft_spectrum)
+            - doppler_zero_pad:  Doppler FFT size as multiple of num_chirps (see DopplerAlgo)
+            - num_beams:         number of beams of the angle grid
+            - max_angle_degrees: angles range from -max_angle_degrees .. +max_angle_degrees
+            - d_by_lambda:       separation of RX antennas divided by the wavelength
+        """
+        chirp = config.chirp
+
+        self.num_samples = chirp.num_samples
+        self.num_chirps = config.num_chirps
+        self.num_rx_antennas = bin(chirp.rx_mask).count('1')
+        self.chirp_repetition_time_s = config.chirp_repetition_time_s
+        self.frame_repetition_time_s = config.frame_repetition_time_s
+
+        self.bandwidth_Hz = abs(chirp.end_frequency_Hz - chirp.start_frequency_Hz)
+        self.center_frequency_Hz = (chirp.start_frequency_Hz + chirp.end_frequency_Hz) / 2
+        self.wavelength_m = constants.c / self.center_frequency_Hz
+
+        # range
+        self.range_resolution_m = constants.c / (2 * self.bandwidth_Hz)
+        self.max_range_m = self.range_resolution_m * self.num_samples / 2
+        self.range_zero_pad = range_zero_pad
+        self.num_range_bins = range_zero_pad * self.num_samples // 2
+        self.range_bin_length_m = self.range_resolution_m / range_zero_pad
+        self.range_axis_m = _read_only(np.arange(self.num_range_bins) * self.range_bin_length_m)
+
+        # velocity, Doppler spectra have zero speed at the centre
+        self.max_speed_m_s = self.wavelength_m / (4 * self.chirp_repetition_time_s)
+        self.speed_resolution_m_s = self.wavelength_m / (2 * self.num_chirps * self.chirp_repetition_time_s)
+        self.doppler_zero_pad = doppler_zero_pad
+        self.num_doppler_bins = doppler_zero_pad * self.num_chirps
+        self.doppler_axis_Hz = constant_cache.fft_frequencies(self.num_doppler_bins, self.chirp_repetition_time_s)
+        self.velocity_axis_m_s = _read_only(self.doppler_axis_Hz * self.wavelength_m / 2)
+
+        # angle grid of the beamformer
+        self.num_beams = num_beams
+        self.max_angle_degrees = max_angle_degrees
+        self.d_by_lambda = d_by_lambda
+        self.angle_axis_degrees = _read_only(np.linspace(-max_angle_degrees, max_angle_degrees, num_beams))
+        self.angle_axis_rad = _read_only(np.radians(self.angle_axis_degrees))
+
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError(f"{type(self).__name__} is immutable")
+        super().__setattr__(name, value)
+
+    def range_gate(self, min_range_m=None, max_range_m=None):
+        """Slice of the range bins between min_range_m and max_range_m (included)"""
+        return range_gate_bins(min_range_m, max_range_m, self.range_bin_length_m, self.num_range_bins)
+
+    def range_of_bin(self, bin_index):
+        """Distance of a (fractional) bin of the range spectrum in metres"""
+        return bin_index * self.range_bin_length_m
+
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
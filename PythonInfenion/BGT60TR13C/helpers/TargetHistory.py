@@ -0,0 +1,46 @@
+import numpy as np
+
+
+class TargetHistory:
+    """Targets of the last frames in a preallocated buffer
+
+    Every frame owns one slot of max_points rows, slots are reused in a
+    circular way once max_frames frames are stored. Adding a frame copies
+    its targets into the slot, nothing is allocated per frame.
+    """
+
+    def __init__(self, max_frames: int, max_points: int = 64, num_columns: int = 3, dtype=np.float64):
+        """Create an empty history
+
+        Parameters:
+            - max_frames:  Number of frames kept, the oldest frame is dropped
+                           when a frame is added to a full history
+            - max_points:  Maximum number of targets per frame, further
+                           targets of a frame are dropped
+            - num_columns: Values per target, e.g. 3 for x, y, z
+        """
+        self.max_frames = max_frames
+        self.max_points = max_points
+        self.buffer = np.zeros((max_frames, max_points, num_columns), dtype=dtype)
+        self.counts = np.zeros(max_frames, dtype=np.intp)
+        # slot the next frame is written to
+        self.index = 0
+        self.num_frames = 0
+        self.point_index = np.arange(max_points)
+
+    def __len__(self):
+        """Number of stored frames"""
+        return min(self.num_frames, self.max_frames)
+
+    def append(self, points):
+        """Add the targets of a frame (num_targets x num_columns)"""
+        count = min(len(points), self.max_points)
+        self.buffer[self.index, :count] = points[:count]
+        self.counts[self.index] = count
+        self.index = (self.index + 1) % self.max_frames
+        self.num_frames += 1
+
+    def points(self):
+        """Targets of all stored frames (num_targets x num_columns)"""
+        valid = self.point_index < self.counts[:, np.newaxis]
+        return self.buffer[valid]
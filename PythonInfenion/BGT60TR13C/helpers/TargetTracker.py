@@ -0,0 +1,149 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+
+class TargetTracker:
+    """Multi-target tracker with constant velocity Kalman filters
+
+    All tracks are kept in preallocated arrays (state, covariance, age, hits,
+    misses), prediction and update run on all tracks at once. Detections are
+    assigned to tracks by a global nearest neighbour assignment (Hungarian
+    algorithm) on the Mahalanobis distances, pairs outside the gate are not
+    assigned. Unassigned detections start new tracks, tracks without
+    detections for more than max_misses frames are deleted.
+    """
+
+    def __init__(self, num_dims: int = 2, max_tracks: int = 32, dt: float = 0.05, process_noise: float = 1.0,
+                 measurement_noise=0.1, initial_velocity_std: float = 1.0, gate: float = 9.21,
+                 confirm_hits: int = 3, max_misses: int = 5):
+        """Create an empty tracker
+
+        Parameters:
+            - num_dims:             Number of measured coordinates, e.g. 2 for x, y
+            - max_tracks:           Maximum number of tracks, detections that
+                                    would start further tracks are dropped
+            - dt:                   Time between two updates in s, e.g. the
+                                    frame repetition time
+            - process_noise:        Standard deviation of the acceleration
+                                    (white noise acceleration model)
+            - measurement_noise:    Standard deviation of the measured
+                                    coordinates, scalar or one per coordinate
+            - initial_velocity_std: Standard deviation of the velocity of a new track
+            - gate:                 Maximum squared Mahalanobis distance of an
+                                    assignment, 9.21 is the 99% quantile of the
+                                    chi-square distribution with 2 degrees of freedom
+            - confirm_hits:         Number of assigned detections after which a
+                                    track is confirmed
+            - max_misses:           Number of consecutive frames without
+                                    detection after which a track is deleted
+        """
+        self.num_dims = num_dims
+        self.max_tracks = max_tracks
+        self.gate = gate
+        self.confirm_hits = confirm_hits
+        self.max_misses = max_misses
+
+        d = num_dims
+        # state: positions followed by velocities
+        self.F = np.eye(2 * d)
+        self.F[:d, d:] = dt * np.eye(d)
+        self.H = np.eye(d, 2 * d)
+        g = np.concatenate((np.full(d, dt ** 2 / 2), np.full(d, dt)))
+        self.Q = process_noise ** 2 * np.outer(g, g) * np.tile(np.eye(d), (2, 2))
+        self.R = np.diag(np.broadcast_to(np.asarray(measurement_noise, dtype=float) ** 2, (d,)))
+        self.initial_covariance = np.diag(np.concatenate((np.diag(self.R), np.full(d, initial_velocity_std ** 2))))
+
+        self.state = np.zeros((max_tracks, 2 * d))
+        self.covariance = np.tile(np.eye(2 * d), (max_tracks, 1, 1))
+        self.active = np.zeros(max_tracks, dtype=bool)
+        self.track_id = np.zeros(max_tracks, dtype=np.int64)
+        self.age = np.zeros(max_tracks, dtype=np.int64)
+        self.hits = np.zeros(max_tracks, dtype=np.int64)
+        self.misses = np.zeros(max_tracks, dtype=np.int64)
+        self.next_id = 1
+
+    def predict(self):
+        """Advance all active tracks by one time step"""
+        active = self.active
+        self.state[active] = self.state[active] @ self.F.T
+        self.covariance[active] = self.F @ self.covariance[active] @ self.F.T + self.Q
+        self.age[active] += 1
+
+    def update(self, measurements):
+        """Predict the tracks and update them with the detections of a frame
+
+        Parameters:
+            - measurements: detections (num_detections x num_dims)
+
+        Returns:
+            - index of the track slot each detection was assigned to or
+              started, -1 if dropped
+        """
+        measurements = np.asarray(measurements, dtype=float).reshape(-1, self.num_dims)
+        self.predict()
+
+        slots = np.flatnonzero(self.active)
+        assigned = np.full(len(measurements), -1)
+        if len(slots) and len(measurements):
+            # innovations of all track / detection pairs (tracks x detections x num_dims)
+            predicted = self.state[slots] @ self.H.T
+            innovation = measurements[np.newaxis, :, :] - predicted[:, np.newaxis, :]
+            S = self.H @ self.covariance[slots] @ self.H.T + self.R
+            S_inv = np.linalg.inv(S)
+            distance = np.einsum('tmi,tij,tmj->tm', innovation, S_inv, innovation)
+
+            cost = np.where(distance <= self.gate, distance, self.gate * 1e3)
+            rows, cols = linear_sum_assignment(cost)
+            valid = distance[rows, cols] <= self.gate
+            rows, cols = rows[valid], cols[valid]
+
+            # Kalman update of the assigned tracks
+            track = slots[rows]
+            P = self.covariance[track]
+            K = P @ self.H.T @ S_inv[rows]
+            self.state[track] += np.einsum('tij,tj->ti', K, innovation[rows, cols])
+            self.covariance[track] = (np.eye(2 * self.num_dims) - K @ self.H) @ P
+            self.hits[track] += 1
+            self.misses[track] = 0
+            assigned[cols] = track
+
+            missed = np.setdiff1d(slots, track)
+        else:
+            missed = slots
+        self.misses[missed] += 1
+        self.active[missed[self.misses[missed] > self.max_misses]] = False
+
+        # start tracks for the unassigned detections in free slots
+        new = np.flatnonzero(assigned < 0)
+        free = np.flatnonzero(~self.active)[:len(new)]
+        new = new[:len(free)]
+        d = self.num_dims
+        self.state[free, :d] = measurements[new]
+        self.state[free, d:] = 0
+        self.covariance[free] = self.initial_covariance
+        self.active[free] = True
+        self.track_id[free] = np.arange(self.next_id, self.next_id + len(free))
+        self.next_id += len(free)
+        self.age[free] = 0
+        self.hits[free] = 1
+        self.misses[free] = 0
+        assigned[new] = free
+        return assigned
+
+    def confirmed(self):
+        """Slots of the active tracks with at least confirm_hits detections"""
+        return np.flatnonzero(self.active & (self.hits >= self.confirm_hits))
+
+    def num_confirmed(self):
+        return len(self.confirmed())
+
+    def tracks(self):
+        """Confirmed tracks
+
+        Returns:
+            - track ids (num_tracks), positions and velocities (num_tracks x
+              num_dims each)
+        """
+        slots = self.confirmed()
+        d = self.num_dims
+        return self.track_id[slots], self.state[slots, :d], self.state[slots, d:]
@@ -0,0 +1,149 @@
+import numpy as np
+from scipy import ndimage, optimize
+
+# Constant false alarm rate (CFAR) detection on range-Doppler, range-angle or
+# range-Doppler-beam power maps.
+#
+# Every cell under test is compared with the noise level estimated from the
+# training cells around it; guard cells next to the cell under test are left
+# out so a target does not raise its own threshold. Guard and training cells
+# are given per axis, 0 training cells on an axis means the window does not
+# extend along it (e.g. the beam axis of a beamformed cube).
+#
+# Detections are returned as a structured array with one integer index
+# field per axis (named by axis_names) and the fields "power", "noise" and
+# "snr" (power / noise, linear).
+
+DEFAULT_AXIS_NAMES = ("range", "doppler", "angle")
+
+# boundary handling per axis: name used by scipy.ndimage -> name used by np.pad
+_PAD_MODES = {"reflect": "symmetric", "mirror": "reflect", "nearest": "edge", "wrap": "wrap"}
+
+
+def detection_dtype(axis_names):
+    return np.dtype([(name, np.int32) for name in axis_names] +
+                    [("power", np.float64), ("noise", np.float64), ("snr", np.float64)])
+
+
+def ca_cfar_scale(num_train, pfa):
+    # Threshold factor of cell-averaging CFAR for exponentially distributed
+    # (square law detected) noise
+    return num_train * (pfa ** (-1 / num_train) - 1)
+
+
+def os_cfar_scale(num_train, rank, pfa):
+    # Threshold factor of ordered-statistic CFAR using the rank-th smallest
+    # (0 based) of num_train training cells, for exponentially distributed noise
+    k = np.arange(rank + 1)
+
+    def log_pfa(scale):
+        return np.sum(np.log(num_train - k) - np.log(num_train - k + scale)) - np.log(pfa)
+
+    upper = 1.0
+    while log_pfa(upper) > 0:
+        upper *= 2
+    return optimize.brentq(log_pfa, 0, upper)
+
+
+def ca_cfar(power, guard, train, pfa=1e-5, mode="reflect", axis_names=None):
+    """Cell-averaging CFAR
+
+    Parameters:
+        - power:      power map (e.g. abs(range_doppler)**2), any number of
+                      dimensions
+        - guard:      number of guard cells on each side, per axis
+        - train:      number of training cells on each side beyond the
+                      guard cells, per axis
+        - pfa:        probability of false alarm per cell
+        - mode:       boundary handling, one of "reflect", "mirror",
+                      "nearest", "wrap", or a sequence with one per axis
+                      ("wrap" suits the Doppler axis)
+        - axis_names: names of the index fields of the detections
+
+    Returns:
+        - detections, structured array (see detection_dtype)
+    """
+    power = np.asarray(power, dtype=np.float64)
+    guard, train = _window(power, guard, train)
+
+    # box sums over training + guard + cell under test and over guard + cell
+    # under test, the difference is the sum over the training cells
+    outer = [2 * (g + t) + 1 for g, t in zip(guard, train)]
+    inner = [2 * g + 1 for g in guard]
+    num_train = int(np.prod(outer) - np.prod(inner))
+    if num_train == 0:
+        raise ValueError("CFAR window has no training cells")
+
+    train_sum = (ndimage.uniform_filter(power, outer, mode=mode) * np.prod(outer) -
+                 ndimage.uniform_filter(power, inner, mode=mode) * np.prod(inner))
+    noise = train_sum / num_train
+
+    return _detections(power, noise, ca_cfar_scale(num_train, pfa), axis_names)
+
+
+def os_cfar(power, guard, train, rank=None, pfa=1e-5, mode="reflect", axis_names=None):
+    """Ordered-statistic CFAR
+
+    More robust than cell averaging when several targets are close to each
+    other, at a higher computational cost.
+
+    Parameters:
+        - power:      power map, any number of dimensions
+        - guard:      number of guard cells on each side, per axis
+        - train:      number of training cells on each side beyond the
+                      guard cells, per axis
+        - rank:       rank (0 based) of the training cell used as noise
+                      estimate, defaults to 3/4 of the training cells
+        - pfa:        probability of false alarm per cell
+        - mode:       boundary handling as for ca_cfar
+        - axis_names: names of the index fields of the detections
+
+    Returns:
+        - detections, structured array (see detection_dtype)
+    """
+    power = np.asarray(power, dtype=np.float64)
+    guard, train = _window(power, guard, train)
+
+    # footprint of the training cells: full window without the guard region
+    footprint = np.ones([2 * (g + t) + 1 for g, t in zip(guard, train)], dtype=bool)
+    footprint[tuple(slice(t, t + 2 * g + 1) for g, t in zip(guard, train))] = False
+    num_train = int(np.count_nonzero(footprint))
+    if num_train == 0:
+        raise ValueError("CFAR window has no training cells")
+    if rank is None:
+        rank = (3 * num_train) // 4
+
+    # rank_filter takes one boundary mode only, so the map is padded per axis
+    modes = [mode] * power.ndim if isinstance(mode, str) else list(mode)
+    padded = power
+    for axis, (g, t, axis_mode) in enumerate(zip(guard, train, modes)):
+        pad_width = [(0, 0)] * power.ndim
+        pad_width[axis] = (g + t, g + t)
+        padded = np.pad(padded, pad_width, mode=_PAD_MODES[axis_mode])
+    noise = ndimage.rank_filter(padded, rank, footprint=footprint, mode="constant")
+    noise = noise[tuple(slice(g + t, g + t + n) for g, t, n in zip(guard, train, power.shape))]
+
+    return _detections(power, noise, os_cfar_scale(num_train, rank, pfa), axis_names)
+
+
+def _window(power, guard, train):
+    guard = tuple(int(g) for g in np.broadcast_to(guard, (power.ndim,)))
+    train = tuple(int(t) for t in np.broadcast_to(train, (power.ndim,)))
+    return guard, train
+
+
+def _detections(power, noise, scale, axis_names):
+    if axis_names is None:
+        axis_names = DEFAULT_AXIS_NAMES[:power.ndim]
+    if len(axis_names) != power.ndim:
+        raise ValueError(f"Expected {power.ndim} axis names, got {len(axis_names)}")
+
+    indices = np.nonzero(power > scale * noise)
+
+    detections = np.empty(len(indices[0]), dtype=detection_dtype(axis_names))
+    for name, index in zip(axis_names, indices):
+        detections[name] = index
+    detections["power"] = power[indices]
+    detections["noise"] = noise[indices]
+    detections["snr"] = detections["power"] / detections["noise"]
+    return detections
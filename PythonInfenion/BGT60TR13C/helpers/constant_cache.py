@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import signal
+
+from helpers import precision
+
+# Process-wide cache of constant arrays: windows, window energies, steering
+# weights and FFT frequency axes.
+#
+# The constants only depend on their kind, length and data type, so every
+# algorithm object of a process shares one read-only copy instead of
+# computing and keeping its own. Entries are keyed by (kind, length, dtype,
+# further parameters) and the least recently used entry is evicted when more
+# than MAX_ENTRIES are stored.
+
+MAX_ENTRIES = 128
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_hits = 0
+_misses = 0
+
+
+def cached(key, compute):
+    # Value stored under key, compute() is called on a miss. Arrays are made
+    # read-only before they are stored.
+    global _hits, _misses
+    with _lock:
+        value = _entries.get(key)
+        if value is not None:
+            _entries.move_to_end(key)
+            _hits += 1
+            return value
+        _misses += 1
+
+    value = compute()
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+
+    with _lock:
+        # another thread may have stored the key meanwhile, keep its value so
+        # all callers share the same array
+        value = _entries.setdefault(key, value)
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return value
+
+
+def window(kind, length, dtype=None):
+    # Window of scipy.signal.windows (e.g. "blackmanharris", "hann"), with
+    # the default (symmetric) form of the scipy function
+    # dtype: defaults to helpers.precision.float_dtype()
+    dtype = precision.float_dtype() if dtype is None else np.dtype(dtype)
+    return cached(("window", kind, length, dtype), lambda: getattr(signal.windows, kind)(length).astype(dtype))
+
+
+def window_energy(kind, length, dtype=None):
+    # Sum of the squared window, divide a power spectrum by it to normalise
+    # for the window
+    dtype = precision.float_dtype() if dtype is None else np.dtype(dtype)
+    return cached(("window_energy", kind, length, dtype),
+                  lambda: np.sum(window(kind, length, dtype).astype(np.float64) ** 2))
+
+
+def steering_weights(num_antennas, num_beams, max_angle_degrees, d_by_lambda, dtype=None):
+    # Beam forming weights of a uniform linear array (num_antennas x
+    # num_beams), element [i, b] is
+    # exp(1j * 2 * pi * i * d_by_lambda * sin(angle_b))
+    # dtype: defaults to helpers.precision.complex_dtype()
+    dtype = precision.complex_dtype() if dtype is None else np.dtype(dtype)
+    key = ("steering_weights", num_antennas, dtype, num_beams, float(max_angle_degrees), float(d_by_lambda))
+
+    def compute():
+        angle_vector = np.radians(np.linspace(-max_angle_degrees, max_angle_degrees, num_beams))
+        antenna_index = np.arange(num_antennas).reshape(num_antennas, 1)
+        weights = np.exp(1j * 2 * np.pi * d_by_lambda * antenna_index * np.sin(angle_vector))  # /sqrt(num_antennas)
+        return weights.astype(dtype)
+
+    return cached(key, compute)
+
+
+def fft_frequencies(length, spacing=1.0, dtype=np.float64, shift=True):
+    # Frequencies of the bins of an FFT of size length, np.fft.fftfreq
+    # spacing: sample spacing, e.g. the chirp repetition time for a Doppler FFT
+    # shift:   True for zero frequency at the centre (after fftshift)
+    dtype = np.dtype(dtype)
+
+    def compute():
+        frequencies = np.fft.fftfreq(length, spacing)
+        if shift:
+            frequencies = np.fft.fftshift(frequencies)
+        return frequencies.astype(dtype)
+
+    return cached(("fft_frequencies", length, dtype, float(spacing), shift), compute)
+
+
+def cache_info():
+    # (hits, misses, number of entries)
+    with _lock:
+        return _hits, _misses, len(_entries)
+
+
+def clear():
+    global _hits, _misses
+    with _lock:
+        _entries.clear()
+        _hits = _misses = 0
@@ -0,0 +1,68 @@
+import scipy.fft
+
+# FFT functions used by the signal processing helpers. Transforms go through
+# scipy.fft, which keeps the plans of recently used sizes cached, or through
+# pyFFTW if it is installed. pyFFTW plans are created once per
+# (shape, axis, dtype) and kept by the pyfftw.interfaces cache.
+#
+# All transforms are split over `workers` threads. One worker is fastest for
+# the frame sizes of a single sensor; offline batch processing or hosts with
+# several sensors can use more, see set_workers.
+try:
+    import pyfftw
+    import pyfftw.interfaces.scipy_fft as pyfftw_fft
+except ImportError:
+    pyfftw = None
+    pyfftw_fft = None
+
+_backend = scipy.fft
+_workers = 1
+
+
+def set_workers(workers: int):
+    # Number of threads per transform, -1 uses all CPU cores
+    global _workers
+    _workers = workers
+
+
+def get_workers():
+    return _workers
+
+
+def use_pyfftw(enable: bool = True):
+    # Switch between pyFFTW and scipy.fft, returns True if pyFFTW is used
+    global _backend
+    if enable and pyfftw is not None:
+        pyfftw.interfaces.cache.enable()
+        # keep plans of all sizes alive, frames arrive every few 100 ms
+        pyfftw.interfaces.cache.set_keepalive_time(60)
+        _backend = pyfftw_fft
+    else:
+        _backend = scipy.fft
+    return _backend is pyfftw_fft
+
+
+def fft(x, n=None, axis=-1):
+    # complex FFT along one axis, n= zero pads
+    return _backend.fft(x, n=n, axis=axis, workers=_workers)
+
+
+def rfft(x, n=None, axis=-1):
+    # FFT of real input, only the non-negative frequencies are returned
+    return _backend.rfft(x, n=n, axis=axis, workers=_workers)
+
+
+def fft2(x, s=None, axes=(-2, -1)):
+    # 2-D complex FFT
+    return _backend.fft2(x, s=s, axes=axes, workers=_workers)
+
+
+def fftshift(x, axes=None):
+    return scipy.fft.fftshift(x, axes=axes)
+
+
+def fftfreq(n, d=1.0):
+    return scipy.fft.fftfreq(n, d)
+
+
+use_pyfftw()
@@ -28,44 +28,85 @@
 
 import numpy as np
 
+from helpers import fft_backend, precision
 
-def fft_spectrum(mat, range_window):
+
+def fft_spectrum(mat, range_window, out=None, zero_pad=2):
     # Calculate fft spectrum
     # mat:          chirp data
     # range_window: window applied on input data before fft
+    # out:          optional preallocated complex output
+    #               (num_chirps x zero_pad * num_samples / 2)
+    # zero_pad:     FFT size as multiple of num_samples
 
     # received data 'mat' is in matrix form for a single receive antenna
     # each row contains 'num_samples' for a single chirp
     # total number of rows = 'num_chirps'
+    return fft_spectrum_frame(mat, range_window, out, zero_pad)
+
+
+def fft_spectrum_frame(frame, range_window, out=None, zero_pad=2):
+    # Calculate fft spectrum for all antennas of a frame at once
+    # frame:        chirp data (num_rx x num_chirps x num_samples), leading
+    #               dimensions are optional
+    # range_window: window applied on input data before fft
+    # out:          optional preallocated complex output, with the shape of
+    #               frame for the default zero_pad of 2
+    # zero_pad:     FFT size as multiple of num_samples
+
+    return range_spectrum(window_frame(frame, range_window), out, zero_pad)
+
+
+def range_gate_bins(min_range_m, max_range_m, range_bin_length, num_bins):
+    # Slice of the range bins between min_range_m and max_range_m
+    # min_range_m:      start of the gate, None starts at the first bin
+    # max_range_m:      end of the gate (included), None ends at the last bin
+    # range_bin_length: distance between two bins of the range spectrum, e.g.
+    #                   DistanceAlgo.range_bin_length
+    # num_bins:         number of bins of the range spectrum
+    start = 0 if min_range_m is None else int(np.ceil(min_range_m / range_bin_length))
+    stop = num_bins if max_range_m is None else int(np.floor(max_range_m / range_bin_length)) + 1
+    return slice(min(max(start, 0), num_bins), min(max(stop, 0), num_bins))
+
+
+def window_frame(frame, range_window):
+    # Remove the DC bias of every chirp and apply the range window
+    # frame:        chirp data (..., num_chirps x num_samples)
+    # range_window: window applied on input data before fft
 
     # -------------------------------------------------
     # Step 1 - remove DC bias from samples
     # -------------------------------------------------
-    [num_chirps, num_samples] = np.shape(mat)
+    # compute row (chirp) averages and de-bias values, in the data type
+    # selected by helpers.precision
+    mat = np.subtract(frame, np.mean(frame, axis=-1, keepdims=True), dtype=precision.float_dtype())
 
-    # helpful in zero padding for high resolution FFT.
-    # compute row (chirp) averages
-    avgs = np.average(mat, 1).reshape(num_chirps, 1)
-
-    # de-bias values
-    mat = mat - avgs
     # -------------------------------------------------
     # Step 2 - Windowing the Data
     # -------------------------------------------------
-    mat = np.multiply(mat, range_window)
+    mat *= range_window
+    return mat
 
-    # -------------------------------------------------
-    # Step 3 - add zero padding here
-    # -------------------------------------------------
-    zp1 = np.pad(mat, ((0, 0), (0, num_samples)), 'constant')
+
+def range_spectrum(mat, out=None, zero_pad=2):
+    # Range FFT of chirp data returned by window_frame
+    # mat:          de-biased and windowed chirp data (..., num_samples)
+    # out:          optional preallocated complex output
+    #               (..., zero_pad * num_samples / 2)
+    # zero_pad:     FFT size as multiple of num_samples, 1 disables zero
+    #               padding, the spectrum then has num_samples / 2 bins
+
+    num_samples = np.shape(mat)[-1]
+    fft_size = zero_pad * num_samples
 
     # -------------------------------------------------
-    # Step 4 - Compute FFT for distance information
+    # Step 3 - Compute FFT for distance information
     # -------------------------------------------------
-    range_fft = np.fft.fft(zp1) / num_samples
+    # The input is real, so the real-input FFT computes only the positive
+    # half of the spectrum. n= zero pads (by default to twice the number of
+    # samples) for the high resolution FFT without an explicit padded copy.
+    range_fft = fft_backend.rfft(mat, n=fft_size, axis=-1)
 
     # ignore the redundant info in negative spectrum
     # compensate energy by doubling magnitude
-    range_fft = 2 * range_fft[:, range(int(num_samples))]
-
-    return range_fft
+    return np.multiply(range_fft[..., :fft_size // 2], 2 / num_samples, out=out)
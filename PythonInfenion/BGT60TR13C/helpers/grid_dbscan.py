@@ -0,0 +1,118 @@
+import itertools
+
+import numpy as np
+
+# DBSCAN clustering of small point clouds with numpy only
+#
+# The points are bucketed into a uniform grid with cells of size eps, so the
+# neighbours of a point within eps can only be in its own and the adjacent
+# cells. Candidate pairs are looked up in the sorted cell keys and filtered
+# by their exact distance, which gives the same neighbourhoods as a radius
+# search. Core points connected by a neighbour pair are merged with a
+# vectorized union-find (minimum label propagation with pointer jumping).
+#
+# Labels follow sklearn.cluster.DBSCAN: clusters are numbered in the order of
+# their first core point, a border point joins the first cluster that
+# reaches it, noise is labelled -1.
+
+
+def grid_dbscan(points, eps, min_samples):
+    # Cluster labels of points
+    # points:      coordinates (num_points x num_dims)
+    # eps:         maximum distance of two neighbours (included)
+    # min_samples: number of neighbours (including the point itself) a core
+    #              point has at least
+    points = _as_2d(points)
+    num_points = len(points)
+    labels = np.full(num_points, -1, dtype=np.intp)
+    if num_points == 0:
+        return labels
+
+    i, j = _neighbour_pairs(points, eps)
+
+    core = np.bincount(i, minlength=num_points) >= min_samples
+
+    # connected components of the core points
+    root = np.arange(num_points)
+    core_pair = core[i] & core[j]
+    ci, cj = i[core_pair], j[core_pair]
+    while True:
+        smallest = np.minimum(root[ci], root[cj])
+        updated = root.copy()
+        np.minimum.at(updated, ci, smallest)
+        np.minimum.at(updated, cj, smallest)
+        updated = updated[updated]  # pointer jumping
+        if np.array_equal(updated, root):
+            break
+        root = updated
+
+    # the root of a component is its smallest core point, numbering the
+    # roots in index order numbers the clusters by their first core point
+    is_root = core & (root == np.arange(num_points))
+    cluster_of_root = np.cumsum(is_root) - 1
+    labels[core] = cluster_of_root[root[core]]
+
+    # border points join the cluster with the smallest label among their
+    # core neighbours
+    border_pair = ~core[i] & core[j]
+    if np.any(border_pair):
+        border_labels = np.full(num_points, num_points, dtype=np.intp)
+        np.minimum.at(border_labels, i[border_pair], labels[j[border_pair]])
+        border = border_labels < num_points
+        labels[border] = border_labels[border]
+    return labels
+
+
+def cluster_centroids(points, labels):
+    # Mean of the points of every cluster (num_clusters x num_dims), noise
+    # (label -1) is ignored
+    points = _as_2d(points)
+    valid = labels >= 0
+    num_clusters = int(labels.max()) + 1 if np.any(valid) else 0
+    counts = np.bincount(labels[valid], minlength=num_clusters)
+    sums = np.zeros((num_clusters, points.shape[1]))
+    np.add.at(sums, labels[valid], points[valid])
+    return sums / counts[:, np.newaxis]
+
+
+def _as_2d(points):
+    # one dimensional points as column
+    points = np.asarray(points, dtype=float)
+    return points[:, np.newaxis] if points.ndim == 1 else points
+
+
+def _neighbour_pairs(points, eps):
+    # All ordered pairs (i, j) of points within eps, including i == j
+    num_points, num_dims = points.shape
+    cell = np.floor(points / eps).astype(np.int64)
+    # one empty cell on every side, so the keys of all adjacent cells are valid
+    cell -= cell.min(axis=0) - 1
+    shape = cell.max(axis=0) + 2
+    strides = np.cumprod(np.concatenate(([1], shape[:0:-1])))[::-1]
+    key = cell @ strides
+
+    order = np.argsort(key, kind="stable")
+    sorted_key = key[order]
+
+    # keys of the own cell and half of the adjacent cells of every point, the
+    # other half is covered by the mirrored pairs. Each run of equal keys in
+    # sorted_key is one cell.
+    offsets = np.array(list(itertools.product((-1, 0, 1), repeat=num_dims)))
+    offsets = offsets[len(offsets) // 2:] @ strides
+    neighbour_key = (key[:, np.newaxis] + offsets).ravel()
+    start = np.searchsorted(sorted_key, neighbour_key, side="left")
+    count = np.searchsorted(sorted_key, neighbour_key, side="right") - start
+
+    # candidate pairs: every point with all points of its adjacent cells
+    total = count.sum()
+    i = np.repeat(np.arange(num_points), count.reshape(num_points, -1).sum(axis=1))
+    position = np.arange(total) + np.repeat(start - (np.cumsum(count) - count), count)
+    j = order[position]
+
+    difference = points[i] - points[j]
+    close = np.sum(difference ** 2, axis=1) <= eps ** 2
+    i, j = i[close], j[close]
+
+    # mirror the pairs of different cells, pairs within a cell are complete
+    other_cell = key[i] != key[j]
+    return np.concatenate((i, j[other_cell])), np.concatenate((j, i[other_cell]))
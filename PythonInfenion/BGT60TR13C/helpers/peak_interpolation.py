@@ -0,0 +1,150 @@
+import numpy as np
+
+# Sub-bin interpolation of spectral peaks
+#
+# The position of a peak is estimated from the peak bin and its two
+# neighbours:
+#   - "parabolic": parabola through the magnitudes
+#   - "gaussian":  parabola through the log magnitudes, exact for a Gaussian
+#                  shaped main lobe
+#   - "phase":     uses the complex bins (Jacobsen estimator), needs the
+#                  complex spectrum; the result does not depend on the phase
+#                  of the signal, so estimates of several chirps can be
+#                  averaged
+#
+# All three are biased depending on the window and the zero padding.
+# PeakInterpolator removes that bias with a lookup table measured on a
+# synthetic tone, so peaks of an unpadded FFT are located as accurately as
+# with zero padding.
+
+METHODS = ("parabolic", "gaussian", "phase")
+
+
+def interpolate_peak(spectrum, peak, method="parabolic"):
+    """Uncorrected fractional offset of a peak from its bin
+
+    Parameters:
+        - spectrum: spectrum (..., num_bins), complex for method "phase"
+        - peak:     index of the peak bin, scalar or broadcastable to
+                    spectrum.shape[:-1]
+        - method:   one of METHODS
+
+    Returns:
+        - offset in bins (-0.5 .. 0.5 for an unbiased estimator), 0 for
+          peaks at the first or last bin
+    """
+    num_bins = spectrum.shape[-1]
+    peak = np.asarray(peak)
+    batch_shape = np.broadcast_shapes(spectrum.shape[:-1], peak.shape)
+    center = np.broadcast_to(np.clip(peak, 1, num_bins - 2), batch_shape)[..., np.newaxis]
+
+    spectrum = np.broadcast_to(spectrum, batch_shape + (num_bins,))
+    a = np.take_along_axis(spectrum, center - 1, axis=-1)[..., 0]
+    b = np.take_along_axis(spectrum, center, axis=-1)[..., 0]
+    c = np.take_along_axis(spectrum, center + 1, axis=-1)[..., 0]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if method == "parabolic":
+            a, b, c = np.abs(a), np.abs(b), np.abs(c)
+            offset = 0.5 * (a - c) / (a - 2 * b + c)
+        elif method == "gaussian":
+            a, b, c = np.log(np.abs(a)), np.log(np.abs(b)), np.log(np.abs(c))
+            offset = 0.5 * (a - c) / (a - 2 * b + c)
+        elif method == "phase":
+            offset = np.real((a - c) / (2 * b - a - c))
+        else:
+            raise ValueError(f"Unknown interpolation method {method!r}, expected one of {', '.join(METHODS)}")
+
+    edge = (peak < 1) | (peak > num_bins - 2)
+    return np.where(edge | ~np.isfinite(offset), 0.0, offset)
+
+
+class PeakInterpolator:
+    """Bias corrected sub-bin peak interpolation for range spectra"""
+
+    def __init__(self, range_window, zero_pad: int = 1, method: str = "parabolic", num_points: int = 201):
+        """Create the lookup table of the interpolator
+
+        Parameters:
+            - range_window: window applied before the FFT (num_samples or
+                            1 x num_samples)
+            - zero_pad:     FFT size as multiple of num_samples
+            - method:       one of METHODS
+            - num_points:   number of points of the lookup table
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown interpolation method {method!r}, expected one of {', '.join(METHODS)}")
+        self.method = method
+        self.zero_pad = zero_pad
+
+        # tones between two bins in the middle of the spectrum, far from DC
+        # and from the mirror frequency
+        window = np.ravel(range_window)
+        num_samples = len(window)
+        fft_size = zero_pad * num_samples
+        center = fft_size // 4
+        true_offset = np.linspace(-0.5, 0.5, num_points)
+        n = np.arange(num_samples)
+        tones = np.cos(2 * np.pi * np.outer(center + true_offset, n) / fft_size) * window
+        spectrum = np.fft.rfft(tones, n=fft_size, axis=-1)
+
+        measured_offset = interpolate_peak(spectrum, center, method)
+        order = np.argsort(measured_offset)
+        self.measured_offset = measured_offset[order]
+        self.true_offset = true_offset[order]
+
+    def offset(self, spectrum, peak):
+        """Bias corrected fractional offset of a peak from its bin
+
+        Parameters:
+            - spectrum: spectrum (..., num_bins), complex for method "phase"
+            - peak:     index of the peak bin, scalar or broadcastable to
+                        spectrum.shape[:-1]
+        """
+        offset = interpolate_peak(spectrum, peak, self.method)
+        return np.interp(offset, self.measured_offset, self.true_offset)
+
+    def refine(self, spectrum, peak):
+        """Fractional bin position of a peak"""
+        return peak + self.offset(spectrum, peak)
+
+
+if __name__ == '__main__':
+    # Distance error of sub-bin interpolation on an unpadded FFT compared to
+    # argmax on the 2x zero padded FFT, for synthetic single targets
+    from scipy import signal
+    from helpers.fft_spectrum import fft_spectrum
+
+    num_samples = 128
+    num_chirps = 16
+    rng = np.random.default_rng(0)
+    window = signal.windows.blackmanharris(num_samples).reshape(1, num_samples)
+
+    n = np.arange(num_samples)
+    target_bins = rng.uniform(10, num_samples / 2 - 10, 1000)
+    errors = {"argmax, 2x padded": [], "argmax, unpadded": []}
+    interpolators = {method: PeakInterpolator(window, zero_pad=1, method=method) for method in METHODS}
+
+    for target_bin in target_bins:
+        phase = rng.uniform(0, 2 * np.pi, (num_chirps, 1))
+        chirps = 0.5 + 0.1 * np.cos(2 * np.pi * target_bin * n / num_samples + phase)
+        chirps += 0.001 * rng.standard_normal(chirps.shape)
+
+        padded = np.abs(fft_spectrum(chirps, window)).mean(axis=0)
+        errors["argmax, 2x padded"].append(np.argmax(padded) / 2 - target_bin)
+
+        range_fft = fft_spectrum(chirps, window, zero_pad=1)
+        profile = np.abs(range_fft).mean(axis=0)
+        peak = np.argmax(profile)
+        errors["argmax, unpadded"].append(peak - target_bin)
+        for method, interpolator in interpolators.items():
+            if method == "phase":
+                estimate = peak + np.mean(interpolator.offset(range_fft, peak))
+            else:
+                estimate = interpolator.refine(profile, peak)
+            errors.setdefault(method + ", unpadded", []).append(estimate - target_bin)
+
+    print("range error in bins of the unpadded FFT")
+    for name, error in errors.items():
+        error = np.abs(error)
+        print(f"{name:20s} mean {np.mean(error):.4f}  max {np.max(error):.4f}")
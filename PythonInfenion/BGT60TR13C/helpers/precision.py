@@ -0,0 +1,129 @@
+import os
+
+import numpy as np
+
+# Floating point precision of the signal processing helpers. The ADC delivers
+# 12 bit samples, so single precision keeps detected range, velocity and
+# angle at the same bins as double precision while halving the memory
+# traffic of every buffer and FFT.
+#
+# Algorithm objects allocate their buffers and windows when they are
+# created, so the precision has to be selected before creating them, either
+# with set_precision or with the environment variable RADAR_PRECISION
+# ("single" or "double").
+PRECISIONS = {
+    "single": (np.float32, np.complex64),
+    "double": (np.float64, np.complex128),
+}
+
+_float_dtype, _complex_dtype = PRECISIONS[os.environ.get("RADAR_PRECISION", "double")]
+
+
+def set_precision(precision: str):
+    # precision: "single" (float32/complex64) or "double" (float64/complex128)
+    global _float_dtype, _complex_dtype
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {', '.join(PRECISIONS)}")
+    _float_dtype, _complex_dtype = PRECISIONS[precision]
+
+
+def get_precision():
+    return "single" if _float_dtype == np.float32 else "double"
+
+
+def float_dtype():
+    return np.dtype(_float_dtype)
+
+
+def complex_dtype():
+    return np.dtype(_complex_dtype)
+
+
+if __name__ == '__main__':
+    # Accuracy of single compared to double precision processing, for
+    # synthetic 12 bit frames with a single target at random range, velocity
+    # and angle. The (range, Doppler, beam) maximum of the beamformed
+    # Range-Doppler cube has to be the same bin, the sub-bin (parabolic)
+    # range, velocity and angle of the maximum and the interpolated
+    # DistanceAlgo distance have to agree within the tolerances below.
+    # Exits with status 1 if a bound is exceeded.
+    import sys
+    from types import SimpleNamespace
+    # the algorithms read the setting of helpers.precision, which is a
+    # different module object than __main__
+    from helpers import precision
+    from helpers.DigitalBeamForming import DigitalBeamForming
+    from helpers.DistanceAlgo import DistanceAlgo
+    from helpers.DopplerAlgo import DopplerAlgo
+    from helpers.SensorGeometry import SensorGeometry
+    from helpers.peak_interpolation import interpolate_peak
+
+    RANGE_TOLERANCE_M = 1e-4
+    VELOCITY_TOLERANCE_M_S = 1e-4
+    ANGLE_TOLERANCE_DEGREES = 0.01
+
+    num_frames = 300
+    chirp = SimpleNamespace(num_samples=128, start_frequency_Hz=60e9, end_frequency_Hz=61.5e9, rx_mask=0b11)
+    config = SimpleNamespace(chirp=chirp, num_chirps=64, chirp_repetition_time_s=0.001, frame_repetition_time_s=0.5)
+    geometry = SensorGeometry(config, num_beams=80, max_angle_degrees=60)
+    num_samples = geometry.num_samples
+    num_chirps = geometry.num_chirps
+    num_antennas = geometry.num_rx_antennas
+    rng = np.random.default_rng(0)
+
+    n = np.arange(num_samples)
+    chirp_index = np.arange(num_chirps).reshape(num_chirps, 1)
+    antenna_index = np.arange(num_antennas).reshape(num_antennas, 1, 1)
+
+    def synthetic_frame(range_bin, doppler_bin, angle_degrees):
+        phase = (2 * np.pi * (range_bin * n / (2 * num_samples) + doppler_bin * chirp_index / num_chirps)
+                 - antenna_index * np.pi * np.sin(np.radians(angle_degrees)))
+        frame = 0.5 + 0.1 * np.cos(phase) + 0.01 * rng.standard_normal((num_antennas, num_chirps, num_samples))
+        # quantised like the 12 bit ADC samples
+        return np.round(frame * 4095) / 4095
+
+    def measure(frame):
+        # peak bins and metric estimates of the target in frame
+        doppler = DopplerAlgo(num_samples, num_chirps, num_antennas, doppler_zero_pad=geometry.doppler_zero_pad)
+        dbf = DigitalBeamForming(num_antennas, geometry.num_beams, geometry.max_angle_degrees)
+        distance = DistanceAlgo(chirp, num_chirps, interpolation="parabolic")
+        beams = np.abs(dbf.run(doppler.compute_doppler_cube(frame)))
+        peak = np.unravel_index(np.argmax(beams), beams.shape)
+        r, d, b = peak
+        range_bin = r + interpolate_peak(beams[:, d, b], r)
+        doppler_bin = d + interpolate_peak(beams[r, :, b], d)
+        beam = b + interpolate_peak(beams[r, d, :], b)
+        angle_step = geometry.angle_axis_degrees[1] - geometry.angle_axis_degrees[0]
+        velocity_step = geometry.velocity_axis_m_s[1] - geometry.velocity_axis_m_s[0]
+        values = {
+            "range": geometry.range_of_bin(range_bin),
+            "velocity": geometry.velocity_axis_m_s[0] + doppler_bin * velocity_step,
+            "angle": geometry.angle_axis_degrees[0] + beam * angle_step,
+            "distance": distance.compute_distance(frame[0])[0],
+        }
+        return peak, values
+
+    tolerances = {"range": RANGE_TOLERANCE_M, "velocity": VELOCITY_TOLERANCE_M_S, "angle": ANGLE_TOLERANCE_DEGREES,
+                  "distance": RANGE_TOLERANCE_M}
+    peak_mismatches = 0
+    max_errors = dict.fromkeys(tolerances, 0.0)
+    for _ in range(num_frames):
+        frame = synthetic_frame(rng.uniform(20, 200), rng.uniform(-25, 25), rng.uniform(-50, 50))
+        precision.set_precision("double")
+        peak_double, values_double = measure(frame)
+        precision.set_precision("single")
+        peak_single, values_single = measure(frame)
+
+        peak_mismatches += peak_double != peak_single
+        for name in tolerances:
+            max_errors[name] = max(max_errors[name], abs(values_double[name] - values_single[name]))
+
+    print(f"single vs double precision, {num_frames} frames")
+    print(f"{'peak bins':10s} different in {peak_mismatches} frames")
+    failed = peak_mismatches > 0
+    for name, tolerance in tolerances.items():
+        exceeded = max_errors[name] > tolerance
+        failed |= exceeded
+        print(f"{name:10s} max difference {max_errors[name]:.3g} (tolerance {tolerance:g})"
+              + ("  EXCEEDED" if exceeded else ""))
+    sys.exit(1 if failed else 0)
@@ -170,18 +170,12 @@ if __name__ == '__main__':
             frame_contents = device.get_next_frame()
             frame = frame_contents[0]
 
-            rd_spectrum = np.zeros((config.chirp.num_samples, 2 * config.num_chirps, num_rx_antennas), dtype=complex)
+            # Compute Doppler spectrum of all antennas
+            # (num_samples_per_chirp x doppler bins x num_rx_antennas)
+            rd_spectrum = doppler.compute_doppler_cube(frame)
 
             beam_range_energy = np.zeros((config.chirp.num_samples, num_beams))
 
-            for i_ant in range(num_rx_antennas):  # For each antenna
-                # Current RX antenna (num_samples_per_chirp x num_chirps_per_frame)
-                mat = frame[i_ant, :, :]
-
-                # Compute Doppler spectrum
-                dfft_dbfs = doppler.compute_doppler_map(mat, i_ant)
-                rd_spectrum[:, :, i_ant] = dfft_dbfs
-
             # Compute Range-Angle map
             rd_beam_formed = dbf.run(rd_spectrum)
             for i_beam in range(num_beams):
@@ -5,9 +5,12 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout
 from PyQt5.QtCore import Qt, QObject, pyqtSignal
 from PyQt5.QtGui import QFont
 from helpers.DopplerAlgo import *
+from helpers.ProcessingGraph import ProcessingGraph
+from helpers.SensorGeometry import SensorGeometry
 from radar_data_acquisition import initialize_radar, get_radar_data
 import threading
 from Fall_Detection_Usecase import FallDetectionAlgo
+from Gesture_Detection_Usecase import GestureDetectionAlgo
 from People_Count_Usecase import PresenceAlgo
 from Posture_Detection_Usecase import PostureDetectionAlgo
 from Presence_Detection_Usecase import run_presence_detection
@@ -18,37 +21,6 @@ class RadarSignals(QObject):
     update_gesture = pyqtSignal(str)
     update_posture = pyqtSignal(str)
     
-class GestureDetectionAlgo:
-    def __init__(self, num_samples, num_chirps, num_rx_antennas):
-        self.num_samples = num_samples
-        self.num_chirps = num_chirps
-        self.num_rx_antennas = num_rx_antennas
-        self.doppler = DopplerAlgo(num_samples, num_chirps, num_rx_antennas)
-
-    def detect_gesture(self, frame_data):
-        detection_occurred = False
-        for i_ant in range(self.num_rx_antennas):
-            if i_ant < frame_data.shape[0]:
-                mat = frame_data[i_ant, :, :]
-                try:
-                    dfft_dbfs = linear_to_dB(self.doppler.compute_doppler_map(mat, i_ant))
-                    if np.any(dfft_dbfs > -59):
-                        detection_occurred = True
-                        break
-                except IndexError as e:
-                    print(f"IndexError in compute_doppler_map: {e}")
-                    print(f"Shape of mat: {mat.shape}")
-                    print(f"i_ant: {i_ant}")
-                    continue
-
-        if detection_occurred:
-            return "Gesture detected"
-        else:
-            return "No gesture detected"
-
-def linear_to_dB(x):
-    return 20 * np.log10(abs(x))
-
 class ButtonDock(QDockWidget):
     def __init__(self, title, parent=None):
         super().__init__(title, parent)
@@ -221,7 +193,9 @@ class RadarGUI(QMainWindow):
         self.people_count_dock.setWidget(people_count_widget)
         self.addDockWidget(Qt.BottomDockWidgetArea, self.people_count_dock)
         
-        initialize_radar()
+        # All usecases share the sensor, each one gets the frames of its own
+        # acquisition profile.
+        initialize_radar(profile_names=("presence", "posture", "fall", "gesture"))
         self.radar_data = get_radar_data()
 
         self.presence_detection = None
@@ -244,53 +218,67 @@ class RadarGUI(QMainWindow):
         self.update_icon_size(100)
 
         # Initializing algorithms
+        posture_config = self.radar_data.profiles["posture"]
         self.posture_algo = PostureDetectionAlgo(
-            self.radar_data.config.chirp.num_samples,
-            self.radar_data.config.num_chirps
-        )
-        self.fall_detection_algo = FallDetectionAlgo(
-            self.radar_data.config.chirp.num_samples,
-            self.radar_data.config.num_chirps,
-            self.radar_data.config.chirp_repetition_time_s,
-            self.radar_data.config.chirp.start_frequency_Hz
+            posture_config.chirp.num_samples,
+            posture_config.num_chirps
         )
+        fall_config = self.radar_data.profiles["fall"]
+        self.fall_detection_algo = FallDetectionAlgo(SensorGeometry(fall_config, doppler_zero_pad=1))
+        presence_config = self.radar_data.profiles["presence"]
         self.presence_algo = PresenceAlgo(
-            self.radar_data.config.chirp.num_samples,
-            self.radar_data.config.num_chirps
+            presence_config.chirp.num_samples,
+            presence_config.num_chirps
         )
-        num_rx_antennas = bin(self.radar_data.config.chirp.rx_mask).count('1')
+        gesture_config = self.radar_data.profiles["gesture"]
+        num_rx_antennas = bin(gesture_config.chirp.rx_mask).count('1')
         self.gesture_algo = GestureDetectionAlgo(
-            self.radar_data.config.chirp.num_samples,
-            self.radar_data.config.num_chirps,
-            num_rx_antennas
+            gesture_config.chirp.num_samples,
+            gesture_config.num_chirps,
+            num_rx_antennas,
+            SensorGeometry(gesture_config)
         )
 
         self.fall_detected_flag = False
-        
-        # Initializing DopplerAlgo
-        num_rx_antennas = bin(self.radar_data.config.chirp.rx_mask).count('1')
-        self.doppler = DopplerAlgo(self.radar_data.config.chirp.num_samples, 
-                                   self.radar_data.config.num_chirps, 
-                                   num_rx_antennas)
+
+        # Every profile gets a geometry, derived once from its configuration
+        # so the processing loops need no SDK calls, and a processing graph,
+        # through which the usecases reading that profile share the
+        # intermediate results of every frame. The presence graph computes
+        # Doppler and beams only for the range bins PresenceAlgo evaluates.
+        self.geometries = {}
+        self.processing_graphs = {}
+        for name in ("presence", "posture", "gesture"):
+            geometry = SensorGeometry(self.radar_data.profiles[name], num_beams=80, max_angle_degrees=60)
+            num_samples = geometry.num_samples
+            self.geometries[name] = geometry
+            self.processing_graphs[name] = ProcessingGraph(
+                num_samples,
+                geometry.num_chirps,
+                geometry.num_rx_antennas,
+                num_beams=geometry.num_beams,
+                max_angle_degrees=geometry.max_angle_degrees,
+                range_gate=slice(num_samples // 8, (3 * num_samples) // 4) if name == "presence" else None
+            )
 
     def run_posture_detection(self):
         thread = threading.Thread(target=self._posture_detection_loop)
         thread.start()
 
     def _posture_detection_loop(self):
-        while True:
-            frame = self.radar_data.get_latest_frame()
-            if frame is not None:
-                mat = frame[0, :, :]
-                state = self.posture_algo.posture(mat)
+        consumer = self.radar_data.subscribe("posture", profile="posture")
+        while self.radar_data.running:
+            record = self.radar_data.wait_for_frame(consumer, timeout=1.0)
+            if record is not None:
+                mat = record.data[0, :, :]
+                products = self.processing_graphs["posture"].products(record)
+                state = self.posture_algo.posture(mat, range_profile=products.range_profile()[0])
                 
                 if state.presence:
                     if len(state.peaks) > 0:
-                        peak_idx = state.peaks[0]
-                        max_range_m = self.radar_data.device.metrics_from_sequence(
-                            self.radar_data.device.get_acquisition_sequence().loop.sub_sequence.contents
-                        ).max_range_m
-                        distance = (peak_idx / self.radar_data.config.chirp.num_samples) * max_range_m
+                        # refined_peaks are counted from detect_start_sample
+                        peak_idx = state.refined_peaks[0] + self.posture_algo.detect_start_sample
+                        distance = self.geometries["posture"].range_of_bin(peak_idx)
 
                         if distance <= 0.50:
                             posture = "standing"
@@ -310,10 +298,11 @@ class RadarGUI(QMainWindow):
         thread.start()
 
     def _fall_detection(self):
-        while True:
-            frame = self.radar_data.get_latest_frame()
-            if frame is not None:
-                mat = frame[0, :, :]  
+        consumer = self.radar_data.subscribe("fall", profile="fall")
+        while self.radar_data.running:
+            record = self.radar_data.wait_for_frame(consumer, timeout=1.0)
+            if record is not None:
+                mat = record.data[0, :, :]
                 fall_detected = self.fall_detection_algo.detect_fall(mat)
                 self.radar_signals.update_fall.emit(fall_detected)
 
@@ -344,16 +333,18 @@ class RadarGUI(QMainWindow):
         thread.start()
 
     def _people_count(self):
-        while True:
-            frame = self.radar_data.get_latest_frame()
-            if frame is not None:
-                mat = frame[0, :, :] 
-                state = self.presence_algo.presence(mat)
+        consumer = self.radar_data.subscribe("people_count", profile="presence")
+        while self.radar_data.running:
+            record = self.radar_data.wait_for_frame(consumer, timeout=1.0)
+            if record is not None:
+                mat = record.data[0, :, :]
+                products = self.processing_graphs["presence"].products(record)
+                state = self.presence_algo.presence(mat, range_profile=products.range_profile()[0])
                 self.radar_signals.update_people_count.emit(state.num_persons)
 
     def run_presence_detection(self):
         if self.presence_detection is None:
-            self.presence_detection = run_presence_detection()
+            self.presence_detection = run_presence_detection(self.processing_graphs["presence"])
             plot = self.presence_detection.initialize_plot()
             self.presence_detection_widget = plot
             self.presence_detection_dock.setWidget(plot)
@@ -388,12 +379,13 @@ class RadarGUI(QMainWindow):
         display_duration = 5
         gesture_detected = False
 
-        while True:
-            frame_data = self.radar_data.get_latest_frame()
-            if frame_data is not None:
-                gesture = self.gesture_algo.detect_gesture(frame_data)
-                
-                current_time = time.time()
+        consumer = self.radar_data.subscribe("gesture", profile="gesture")
+        while self.radar_data.running:
+            record = self.radar_data.wait_for_frame(consumer, timeout=1.0)
+            current_time = time.time()
+            if record is not None:
+                products = self.processing_graphs["gesture"].products(record)
+                gesture = self.gesture_algo.detect_gesture(record.data, rd_spectrum=products.range_doppler())
 
                 if gesture == "Gesture detected":
                     if current_time - last_detection_time > detection_suppress_time:
@@ -402,12 +394,10 @@ class RadarGUI(QMainWindow):
                         last_detection_time = current_time
                         gesture_detected = True
 
-                if gesture_detected and current_time - last_detection_time > display_duration:
-                    print("No gesture detected")
-                    self.radar_signals.update_gesture.emit("No gesture detected")
-                    gesture_detected = False
-
-            time.sleep(0.01)
+            if gesture_detected and current_time - last_detection_time > display_duration:
+                print("No gesture detected")
+                self.radar_signals.update_gesture.emit("No gesture detected")
+                gesture_detected = False
 
     def update_gesture_detection_status(self, gesture):
         self.gesture_detection_label.setText(f"Gesture: {gesture}")
@@ -1,131 +1,391 @@
 import threading
 import time
+from collections import deque, namedtuple
 from ifxradarsdk import get_version_full
 from ifxradarsdk.fmcw import DeviceFmcw
 from ifxradarsdk.fmcw.types import FmcwSimpleSequenceConfig, FmcwSequenceChirp
+from frame_bus import SharedFrameBus, frame_nbytes
+from frame_recording import FrameRecorder
+from replay_device import ReplayDeviceFmcw
+
+# A single acquired frame. Sequence numbers start at 1 and increase by one per
+# frame; the timestamp is the time.time() at which the frame was received.
+# profile is the name of the acquisition profile the frame was measured with.
+FrameRecord = namedtuple("FrameRecord", ["sequence", "timestamp", "data", "profile"])
+
+# Sensor configurations of the usecases
+PROFILES = {
+    # Presence_Detection_Usecase and People_Detection_Usecase
+    "presence": FmcwSimpleSequenceConfig(
+        frame_repetition_time_s=0.5,
+        chirp_repetition_time_s=0.001,
+        num_chirps=64,
+        tdm_mimo=False,
+        chirp=FmcwSequenceChirp(
+            start_frequency_Hz=60e9,
+            end_frequency_Hz=61.5e9,
+            sample_rate_Hz=2e6,
+            num_samples=128,
+            rx_mask=5,
+            tx_mask=1,
+            tx_power_level=31,
+            lp_cutoff_Hz=500000,
+            hp_cutoff_Hz=80000,
+            if_gain_dB=33,
+        )
+    ),
+    # Posture_Detection_Usecase
+    "posture": FmcwSimpleSequenceConfig(
+        frame_repetition_time_s=0.5,
+        chirp_repetition_time_s=0.001,
+        num_chirps=64,
+        tdm_mimo=False,
+        chirp=FmcwSequenceChirp(
+            start_frequency_Hz=60e9,
+            end_frequency_Hz=61.5e9,
+            sample_rate_Hz=2e6,
+            num_samples=128,
+            rx_mask=7,
+            tx_mask=1,
+            tx_power_level=31,
+            lp_cutoff_Hz=500000,
+            hp_cutoff_Hz=80000,
+            if_gain_dB=33,
+        )
+    ),
+    # Fall_Detection_Usecase
+    "fall": FmcwSimpleSequenceConfig(
+        frame_repetition_time_s=0.5,
+        chirp_repetition_time_s=283e-6,
+        num_chirps=64,
+        tdm_mimo=False,
+        chirp=FmcwSequenceChirp(
+            start_frequency_Hz=60e9,
+            end_frequency_Hz=63.5e9,
+            sample_rate_Hz=1e6,
+            num_samples=128,
+            rx_mask=5,
+            tx_mask=1,
+            tx_power_level=31,
+            lp_cutoff_Hz=500000,
+            hp_cutoff_Hz=80000,
+            if_gain_dB=45,
+        )
+    ),
+    # Gesture_Detection_Usecase
+    "gesture": FmcwSimpleSequenceConfig(
+        frame_repetition_time_s=0.5,
+        chirp_repetition_time_s=283e-6,
+        num_chirps=64,
+        tdm_mimo=False,
+        chirp=FmcwSequenceChirp(
+            start_frequency_Hz=60e9,
+            end_frequency_Hz=61.5e9,
+            sample_rate_Hz=1e6,
+            num_samples=128,
+            rx_mask=5,
+            tx_mask=1,
+            tx_power_level=31,
+            lp_cutoff_Hz=500000,
+            hp_cutoff_Hz=80000,
+            if_gain_dB=33,
+        )
+    ),
+}
+
+
+class FrameConsumer:
+    """Read position and loss counters of one consumer of the frame buffer"""
+
+    def __init__(self, name, profile=None):
+        self.name = name
+        # only frames of this profile are delivered, None for all frames
+        self.profile = profile
+        self.last_sequence = 0
+        self.delivered = 0
+        # frames that were overwritten in the ring buffer before being read
+        self.dropped = 0
+        # number of reads that found a gap, i.e. the consumer fell behind
+        self.overruns = 0
+
 
 class RadarDataAcquisition:
-    def __init__(self, config):
-        self.config = config
+    def __init__(self, config, buffer_size=32, shared_memory_name=None, shared_memory_slots=8,
+                 replay_path=None, replay_realtime=True, profiles=None, schedule=None):
+        """Create the acquisition
+
+        Parameters:
+            - config:               FmcwSimpleSequenceConfig of the sensor,
+                                    may be None if profiles are given
+            - buffer_size:          number of frames kept in the ring buffer
+            - shared_memory_name:   if set, frames are also published to a
+                                    SharedFrameBus of this name for usecase
+                                    workers in other processes
+            - shared_memory_slots:  number of frames in the shared memory ring
+            - replay_path:          if set, frames are read from this recording
+                                    with ReplayDeviceFmcw instead of the sensor
+            - replay_realtime:      pace replayed frames at the frame rate
+            - profiles:             dict of profile name -> config for
+                                    time-multiplexed acquisition
+            - schedule:             profile names in acquisition order, repeated
+                                    cyclically (default: every profile once)
+        """
+        if profiles is None:
+            profiles = {"default": config}
+        if schedule is None:
+            schedule = list(profiles)
+        if not schedule or any(name not in profiles for name in schedule):
+            raise ValueError(f"Invalid profile schedule {schedule}")
+
+        self.profiles = profiles
+        self.schedule = list(schedule)
+        # config of the first scheduled profile for single-profile users
+        self.config = config if config is not None else profiles[self.schedule[0]]
+        self.sequences = {}
         self.device = None
         self.latest_frame = None
         self.running = False
         self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)
+
+        self.frames = deque(maxlen=buffer_size)
+        self.sequence = 0
+        self.consumers = {}
+
+        self.shared_memory_name = shared_memory_name
+        self.shared_memory_slots = shared_memory_slots
+        self.frame_bus = None
+
+        self.replay_path = replay_path
+        self.replay_realtime = replay_realtime
+
+        self.recorder = None
+        self.recording_lock = threading.Lock()
 
     def start(self):
-        self.device = DeviceFmcw()
+        if self.replay_path is not None:
+            self.device = ReplayDeviceFmcw(self.replay_path, realtime=self.replay_realtime)
+        else:
+            self.device = DeviceFmcw()
         print(f"Radar SDK Version: {get_version_full()}")
         print("Sensor: " + str(self.device.get_sensor_type()))
 
-        sequence = self.device.create_simple_sequence(self.config)
-        self.device.set_acquisition_sequence(sequence)
+        # All sequences are created up front, switching profiles only swaps
+        # the acquisition sequence of the open device.
+        for name in dict.fromkeys(self.schedule):
+            self.sequences[name] = self.device.create_simple_sequence(self.profiles[name])
+        self.device.set_acquisition_sequence(self.sequences[self.schedule[0]])
+
+        if self.shared_memory_name is not None:
+            frame_size = max(frame_nbytes(self.profiles[name]) for name in self.sequences)
+            self.frame_bus = SharedFrameBus(self.shared_memory_name, frame_size, self.shared_memory_slots)
 
         self.running = True
         self.acquisition_thread = threading.Thread(target=self._acquire_data)
         self.acquisition_thread.start()
 
     def _acquire_data(self):
+        current_profile = self.schedule[0]
         while self.running:
-            frame_contents = self.device.get_next_frame()
+            profile = self.schedule[self.sequence % len(self.schedule)]
+            if profile != current_profile:
+                self.device.stop_acquisition()
+                self.device.set_acquisition_sequence(self.sequences[profile])
+                current_profile = profile
+            try:
+                frame_contents = self.device.get_next_frame()
+            except EOFError:
+                # end of a replayed recording
+                with self.new_frame:
+                    self.running = False
+                    self.new_frame.notify_all()
+                break
+            timestamp = time.time()
             with self.lock:
+                self.sequence += 1
+                self.frames.append(FrameRecord(self.sequence, timestamp, frame_contents[0], profile))
                 self.latest_frame = frame_contents[0]
+                self.new_frame.notify_all()
+                sequence = self.sequence
+            if self.frame_bus is not None:
+                self.frame_bus.publish(sequence, timestamp, frame_contents[0])
+            with self.recording_lock:
+                if self.recorder is not None and profile in self.recorder.profiles:
+                    self.recorder.write(sequence, timestamp, frame_contents[0], profile)
 
     def get_latest_frame(self):
+        # latest frame of any profile
         with self.lock:
             return self.latest_frame
 
+    def profile_of_sequence(self, sequence):
+        """Name of the profile the frame with this sequence number was acquired with"""
+        return self.schedule[(sequence - 1) % len(self.schedule)]
+
+    def register_consumer(self, name, profile=None):
+        """Register a consumer reading from the ring buffer
+
+        A new consumer starts at the current end of the buffer, i.e. it only
+        sees frames acquired after registration. If profile is given, the
+        consumer only gets frames acquired with that profile.
+        """
+        if profile is not None and profile not in self.schedule:
+            raise ValueError(f"Profile {profile} is not acquired")
+        with self.lock:
+            consumer = FrameConsumer(name, profile)
+            consumer.last_sequence = self.sequence
+            self.consumers[name] = consumer
+            return consumer
+
+    def subscribe(self, name, profile=None):
+        """Subscribe to the frame stream, see wait_for_frame"""
+        return self.register_consumer(name, profile)
+
+    def wait_for_frame(self, consumer, timeout=None):
+        """Block until the consumer has an unseen frame and return it
+
+        Frames are delivered exactly once and in order. The consumer's
+        last_sequence acts as its generation counter: it is advanced to the
+        sequence of the returned frame. Frames that were overwritten in the
+        ring buffer before the consumer got to them are counted as dropped.
+
+        Parameters:
+            - consumer: FrameConsumer returned by subscribe
+            - timeout:  maximum time to wait in seconds, None waits forever
+
+        Returns:
+            - FrameRecord, or None on timeout or when acquisition stopped
+        """
+        with self.new_frame:
+            self.new_frame.wait_for(lambda: self._has_new_frame(consumer) or not self.running, timeout)
+            if not self._has_new_frame(consumer):
+                return None
+            frames = self._frames_since(consumer.last_sequence, consumer, limit=1)
+            return frames[0] if frames else None
+
+    def get_frames_since(self, sequence, consumer=None):
+        """Return all buffered frames with a sequence number above sequence
+
+        Parameters:
+            - sequence: last sequence number already seen by the caller
+            - consumer: optional FrameConsumer whose counters are updated with
+                        the delivered and dropped frames
+        """
+        with self.lock:
+            return self._frames_since(sequence, consumer)
+
+    def get_new_frames(self, consumer):
+        """Return all frames the consumer has not seen yet, oldest first"""
+        with self.lock:
+            return self._frames_since(consumer.last_sequence, consumer)
+
+    def get_last_frames(self, count, profile=None):
+        """Return the last count buffered frames (of a profile), oldest first"""
+        with self.lock:
+            if count <= 0:
+                return []
+            return [frame for frame in self.frames if profile is None or frame.profile == profile][-count:]
+
+    def _has_new_frame(self, consumer):
+        for frame in reversed(self.frames):
+            if frame.sequence <= consumer.last_sequence:
+                break
+            if consumer.profile is None or frame.profile == consumer.profile:
+                return True
+        return False
+
+    def _count_profile_frames(self, first, last, profile):
+        # Number of frames of a profile with sequence numbers first .. last.
+        # The schedule is deterministic, so this is known even for frames
+        # that are no longer buffered.
+        if last < first:
+            return 0
+        if profile is None:
+            return last - first + 1
+        full_cycles, remainder = divmod(last - first + 1, len(self.schedule))
+        count = full_cycles * self.schedule.count(profile)
+        return count + sum(1 for sequence in range(first, first + remainder)
+                           if self.profile_of_sequence(sequence) == profile)
+
+    def _frames_since(self, sequence, consumer, limit=None):
+        profile = consumer.profile if consumer is not None else None
+
+        # Sequence numbers in the buffer are contiguous, so the position of a
+        # frame follows directly from its sequence number.
+        if self.frames:
+            first_sequence = self.frames[0].sequence
+            start = max(sequence + 1 - first_sequence, 0)
+            frames = [self.frames[i] for i in range(start, len(self.frames))
+                      if profile is None or self.frames[i].profile == profile]
+            if limit is not None:
+                frames = frames[:limit]
+            missed = self._count_profile_frames(sequence + 1, first_sequence - 1, profile)
+        else:
+            frames = []
+            missed = self._count_profile_frames(sequence + 1, self.sequence, profile)
+
+        if consumer is not None:
+            if missed > 0:
+                consumer.dropped += missed
+                consumer.overruns += 1
+            consumer.delivered += len(frames)
+            if frames:
+                consumer.last_sequence = frames[-1].sequence
+            else:
+                consumer.last_sequence = max(consumer.last_sequence, self.sequence)
+        return frames
+
+    def start_recording(self, path, frames_per_chunk=64, profile=None):
+        """Record all following frames to path, see frame_recording
+
+        The frames of every acquired profile are recorded together with their
+        profile, so the recording can be replayed with the same profiles. If
+        profile is given, only the frames of that profile are recorded.
+        """
+        names = dict.fromkeys(self.schedule) if profile is None else [profile]
+        recorder = FrameRecorder(path, None, frames_per_chunk=frames_per_chunk,
+                                 profiles={name: self.profiles[name] for name in names})
+        with self.recording_lock:
+            if self.recorder is not None:
+                self.recorder.close()
+            self.recorder = recorder
+
+    def stop_recording(self):
+        with self.recording_lock:
+            if self.recorder is not None:
+                self.recorder.close()
+                self.recorder = None
+
     def stop(self):
-        self.running = False
+        with self.new_frame:
+            self.running = False
+            self.new_frame.notify_all()
         if self.acquisition_thread:
             self.acquisition_thread.join()
         if self.device:
             self.device.close()
+        self.stop_recording()
+        if self.frame_bus:
+            self.frame_bus.close()
+            self.frame_bus = None
 
 radar_data = None
 
-def initialize_radar():
+def initialize_radar(replay_path=None, replay_realtime=True, profile_names=("presence",), schedule=None,
+                     shared_memory_name=None):
+    """Start the global acquisition
+
+    Parameters:
+        - profile_names:      names of PROFILES to acquire time-multiplexed
+        - schedule:           order of profiles, see RadarDataAcquisition
+        - shared_memory_name: publish the frames to a SharedFrameBus of this
+                              name for worker processes, see frame_bus
+    """
     global radar_data
-    #Presence_Detection_Usecase and People_Detection_Usecase 
-    config = FmcwSimpleSequenceConfig(
-        frame_repetition_time_s=0.5,
-        chirp_repetition_time_s=0.001,
-        num_chirps=64,
-        tdm_mimo=False,
-        chirp=FmcwSequenceChirp(
-            start_frequency_Hz=60e9,
-            end_frequency_Hz=61.5e9,
-            sample_rate_Hz=2e6,
-            num_samples=128,
-            rx_mask=5,
-            tx_mask=1,
-            tx_power_level=31,
-            lp_cutoff_Hz=500000,
-            hp_cutoff_Hz=80000,
-            if_gain_dB=33,
-        )
-    )
-    
-    # #Posture_Detection_Usecase
-    # config = FmcwSimpleSequenceConfig(
-    #     frame_repetition_time_s=0.5,
-    #     chirp_repetition_time_s=0.001,
-    #     num_chirps=64,
-    #     tdm_mimo=False,
-    #     chirp=FmcwSequenceChirp(
-    #         start_frequency_Hz=60e9,
-    #         end_frequency_Hz=61.5e9,
-    #         sample_rate_Hz=2e6,
-    #         num_samples=128,
-    #         rx_mask=7,
-    #         tx_mask=1,
-    #         tx_power_level=31,
-    #         lp_cutoff_Hz=500000,
-    #         hp_cutoff_Hz=80000,
-    #         if_gain_dB=33,
-    #     )
-    # )
-    
-    # #Fall_Detection_Usecase
-    # config = FmcwSimpleSequenceConfig(
-    #     frame_repetition_time_s=0.5,
-    #     chirp_repetition_time_s=283e-6,
-    #     num_chirps=64,
-    #     tdm_mimo=False,
-    #     chirp=FmcwSequenceChirp(
-    #         start_frequency_Hz=60e9,
-    #         end_frequency_Hz=63.5e9,
-    #         sample_rate_Hz=1e6,
-    #         num_samples=128,
-    #         rx_mask=5,
-    #         tx_mask=1,
-    #         tx_power_level=31,
-    #         lp_cutoff_Hz=500000,
-    #         hp_cutoff_Hz=80000,
-    #         if_gain_dB=45,
-    #     )
-    # )
-    
-    # #Gesture_Detection_Usecase
-    # config = FmcwSimpleSequenceConfig(
-    #     frame_repetition_time_s=0.5,
-    #     chirp_repetition_time_s=283e-6,
-    #     num_chirps=64,
-    #     tdm_mimo=False,
-    #     chirp=FmcwSequenceChirp(
-    #         start_frequency_Hz=60e9,
-    #         end_frequency_Hz=61.5e9,
-    #         sample_rate_Hz=1e6,
-    #         num_samples=128,
-    #         rx_mask=5,
-    #         tx_mask=1,
-    #         tx_power_level=31,
-    #         lp_cutoff_Hz=500000,
-    #         hp_cutoff_Hz=80000,
-    #         if_gain_dB=33,
-    #     )
-    # )
-    radar_data = RadarDataAcquisition(config)
+    profiles = {name: PROFILES[name] for name in profile_names}
+    radar_data = RadarDataAcquisition(None, replay_path=replay_path, replay_realtime=replay_realtime,
+                                      profiles=profiles, schedule=schedule, shared_memory_name=shared_memory_name)
     radar_data.start()
 
 def get_radar_data():
-    return radar_data
\ No newline at end of file
+    return radar_data
@@ -0,0 +1,159 @@
+import time
+from types import SimpleNamespace
+import numpy as np
+from scipy import constants
+from frame_recording import FrameRecordingReader, config_to_dict
+
+
+class ReplayDeviceFmcw:
+    """Stand-in for ifxradarsdk.fmcw.DeviceFmcw that replays recorded frames
+
+    Only the part of the DeviceFmcw API used in this project is provided. The
+    recording is either a file written by frame_recording.FrameRecorder or a
+    .npy file holding an array of dimension
+    num_frames x num_rx_antennas x num_chirps_per_frame x num_samples_per_chirp.
+
+    A recording of several acquisition profiles is replayed per profile:
+    every sequence is bound to the recorded profile with the same config,
+    and get_next_frame returns the next recorded frame of the profile of the
+    current sequence. A single profile recording is replayed for any config
+    with the recorded frame shape.
+    """
+
+    def __init__(self, path: str, realtime: bool = True, loop: bool = False):
+        """Open a recording
+
+        Parameters:
+            - path:     recorded session
+            - realtime: if True frames are paced at frame_repetition_time_s,
+                        otherwise they are returned as fast as possible
+            - loop:     start over at the end of the recording instead of
+                        raising EOFError
+        """
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+
+        if path.endswith(".npy"):
+            self.frames = np.load(path, mmap_mode="r")
+            if self.frames.ndim != 4:
+                raise ValueError(f"Expected recorded frames of dimension 4, got {self.frames.shape}")
+            self.frame_shapes = {"default": self.frames.shape[1:]}
+            self.recorded_configs = {"default": None}
+            self.positions = {"default": np.arange(len(self.frames))}
+        else:
+            self.frames = FrameRecordingReader(path)
+            self.frame_shapes = self.frames.frame_shapes
+            self.recorded_configs = self.frames.profiles
+            self.positions = {name: self.frames.positions_of_profile(name) for name in self.frames.profile_names}
+
+        self.sequence = None
+        # next frame of every recorded profile, as index into its positions
+        self.frame_index = dict.fromkeys(self.positions, 0)
+        # time the last frame was due, one clock for all sequences so that
+        # switching profiles between frames keeps the pacing
+        self.last_frame_time = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_sensor_type(self):
+        return f"Replay({self.path})"
+
+    def create_simple_sequence(self, config):
+        # Mirrors the element structure of the SDK: frame loop -> chirp loop -> chirp
+        profile = self._recorded_profile(config)
+
+        chirp_element = SimpleNamespace(chirp=config.chirp)
+        chirp_loop = SimpleNamespace(
+            num_repetitions=config.num_chirps,
+            repetition_time_s=config.chirp_repetition_time_s,
+            loop=SimpleNamespace(sub_sequence=SimpleNamespace(contents=chirp_element)))
+        return SimpleNamespace(
+            config=config,
+            profile=profile,
+            repetition_time_s=config.frame_repetition_time_s,
+            loop=SimpleNamespace(sub_sequence=SimpleNamespace(contents=chirp_loop)))
+
+    def _recorded_profile(self, config):
+        # Name of the recorded profile replayed for config: the profile with
+        # the same config, or the profile of a single profile recording if
+        # the frame shapes match
+        num_rx_antennas = bin(config.chirp.rx_mask).count('1')
+        expected_shape = (num_rx_antennas, config.num_chirps, config.chirp.num_samples)
+
+        config_dict = config_to_dict(config)
+        for name, recorded_config in self.recorded_configs.items():
+            if recorded_config is not None and config_to_dict(recorded_config) == config_dict:
+                return name
+
+        if len(self.frame_shapes) == 1:
+            name, shape = next(iter(self.frame_shapes.items()))
+            if shape != expected_shape:
+                raise ValueError(f"Recorded frames have shape {shape}, config expects {expected_shape}")
+            return name
+
+        recorded = ", ".join(f"{name} {shape}" for name, shape in self.frame_shapes.items())
+        raise ValueError(f"No profile of {self.path} was recorded with this config (frames of shape "
+                         f"{expected_shape}), recorded profiles: {recorded}")
+
+    def set_acquisition_sequence(self, sequence):
+        self.sequence = sequence
+
+    def get_acquisition_sequence(self):
+        return self.sequence
+
+    def metrics_from_sequence(self, chirp_loop):
+        chirp = chirp_loop.loop.sub_sequence.contents.chirp
+        bandwidth_hz = abs(chirp.end_frequency_Hz - chirp.start_frequency_Hz)
+        center_frequency_hz = (chirp.start_frequency_Hz + chirp.end_frequency_Hz) / 2
+        wavelength_m = constants.c / center_frequency_hz
+        range_resolution_m = constants.c / (2 * bandwidth_hz)
+        return SimpleNamespace(
+            range_resolution_m=range_resolution_m,
+            max_range_m=range_resolution_m * chirp.num_samples / 2,
+            max_speed_m_s=wavelength_m / (4 * chirp_loop.repetition_time_s),
+            speed_resolution_m_s=wavelength_m / (2 * chirp_loop.num_repetitions * chirp_loop.repetition_time_s),
+            center_frequency_Hz=center_frequency_hz)
+
+    def get_next_frame(self, timeout_ms=None):
+        if self.sequence is None:
+            raise RuntimeError("No acquisition sequence set")
+
+        profile = self.sequence.profile
+        positions = self.positions[profile]
+        if self.frame_index[profile] >= len(positions):
+            if not self.loop or len(positions) == 0:
+                raise EOFError(f"End of recording {self.path}")
+            self.frame_index[profile] = 0
+
+        if self.realtime:
+            # a frame is due one frame repetition time of the current
+            # sequence after the previous frame
+            now = time.monotonic()
+            due = now
+            if self.last_frame_time is not None:
+                repetition_time_s = self.sequence.repetition_time_s
+                due = self.last_frame_time + repetition_time_s
+                if due > now:
+                    time.sleep(due - now)
+                elif now - due > repetition_time_s:
+                    # the reader paused, continue from now instead of
+                    # returning the missed frames in a burst
+                    due = now
+            self.last_frame_time = due
+
+        frame = np.array(self.frames[positions[self.frame_index[profile]]])
+        self.frame_index[profile] += 1
+        return [frame]
+
+    def stop_acquisition(self):
+        # the frame clock keeps running, RadarDataAcquisition stops the
+        # acquisition for every profile switch
+        pass
+
+    def close(self):
+        self.frames = None